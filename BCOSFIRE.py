@@ -17,42 +17,40 @@ this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blo
 """
 
 
+import os
 import numpy as np
 import cosfire as c
 
-def BCOSFIRE(img_rgb, mask=[]):
-	## Model configuration
-
-	proto_symm = np.zeros(shape=(201,201)).astype(np.uint8)
-	proto_symm[:,100] = 255
+def BCOSFIRE(img_rgb, mask=[], shiftMode='roll', n_jobs=1, dtype=np.float32, combiner='log', cache=None, profiler=None, store=None, storeOptions=None):
+	# shiftMode='window' shifts the responses without allocations and without wrapping
+	# around the border (see CircleStrategy), which changes the output near the border
+	# n_jobs > 1 evaluates the filters and orientations on that many threads
+	# dtype sets the precision of the computation; use np.float64 to reproduce the reference output
+	# combiner='log' computes the geometric means in the log domain, 'product' as the n-th root of the product
+	# cache (a c.SharedResponseCache) reuses the filter responses of earlier calls on the same image
+	# profiler (a c.Profiler) records the time and memory spent in every stage of both filters
+	# store (a directory or a c.ResponseStore) receives resp, segresp, and for both filters (symm and asymm) the
+	# filter responses and the response of every orientation, see writeStore; the responses are then computed
+	# over the whole image instead of only inside the field of view. storeOptions are passed to c.StoreRecorder,
+	# e.g. quantize=None or compression=None
+	cosfire_symm, cosfire_asymm = fitModels(shiftMode, n_jobs, dtype, combiner, cache, profiler)
 
-	subject = 255 - img_rgb[:,:,1]
-	subject = subject/255
-	
-	cx, cy = (100,100)
-
-	# Symmetrical filter
-	cosfire_symm = c.COSFIRE(
-		c.CircleStrategy(c.DoGFilter, (2.4, 1), prototype=proto_symm, center=(cx,cy), rhoList=range(0,9,2), sigma0=3,  alpha=0.7,
-		rotationInvariance = np.arange(12)/12*np.pi)
-	   ).fit()
-	resp_symm = cosfire_symm.transform(subject)
+	subject = np.subtract(255, img_rgb[:,:,1], dtype=dtype)
+	subject /= 255
 
-	# Asymmetrical filter
-	cosfire_asymm = c.COSFIRE(
-			c.CircleStrategy(c.DoGFilter, (1.8, 1), prototype=proto_symm, center=(cx,cy), rhoList=range(0,23,2), sigma0=2,  alpha=0.1,
-			rotationInvariance = np.arange(24)/12*np.pi)
-		   ).fit()
+	# Only compute the responses inside the field of view
+	fov = mask if np.shape(mask) == subject.shape else None
 
+	if store is not None:
+		opened = not isinstance(store, c.ResponseStore)
+		store = c.ResponseStore(store, 'w') if opened else store
+		storeOptions = {} if storeOptions is None else storeOptions
+		cosfire_symm.strategy.recorder = c.StoreRecorder(store, 'symm', **storeOptions)
+		cosfire_asymm.strategy.recorder = c.StoreRecorder(store, 'asymm', **storeOptions)
+		fov = None
 
-	# Make asymmetrical
-	asymmTuples = []
-	for tupl in cosfire_asymm.strategy.tuples:
-		if tupl[1] <= np.pi:
-			asymmTuples.append(tupl)
-	cosfire_asymm.strategy.tuples = asymmTuples
-	resp_asymm = cosfire_asymm.transform(subject)
-
+	resp_symm = cosfire_symm.transform(subject, fov)
+	resp_asymm = cosfire_asymm.transform(subject, fov)
 
 	resp = resp_symm + resp_asymm
 	resp_symm = c.rescaleImage(resp_symm, 0, 255)
@@ -60,19 +58,405 @@ def BCOSFIRE(img_rgb, mask=[]):
 	resp = np.multiply(resp, mask)
 	resp = c.rescaleImage(resp, 0, 255)
 	segresp = np.where(resp > 37, 255, 0)
+
+	if store is not None:
+		writeStore(store, resp, segresp)
+		if opened:
+			store.close()
 	return resp,segresp
 
+# Write the outputs of BCOSFIRE() to a c.ResponseStore, next to the responses recorded by the filters:
+#  - resp: the response, without quantization
+#  - segresp: the segmentation, as uint8
+#  - symm/filtered, asymm/filtered: the DoG responses after the threshold T1, as (filter arguments, height, width)
+#  - symm/orientations, asymm/orientations: the combined response of every orientation, as (orientations, height, width)
+# By default, the responses of the filters are stored as float16, every array in compressed tiles of 256 x 256 pixels
+def writeStore(store, resp, segresp):
+	store.write('resp', resp)
+	store.write('segresp', segresp.astype(np.uint8))
+	store.flush()
+
+# Parameters of the symmetrical and asymmetrical B-COSFIRE filters, as keyword arguments of c.CircleStrategy
+# maxPhi keeps the tuples with phi <= maxPhi after fitting, which makes the filter asymmetrical
+def filterParameters():
+	## Model configuration
+
+	proto_symm = np.zeros(shape=(201,201)).astype(np.uint8)
+	proto_symm[:,100] = 255
+
+	cx, cy = (100,100)
+
+	return {
+		# Symmetrical filter
+		'symm': dict(filt=c.DoGFilter, filterArgs=(2.4, 1), prototype=proto_symm, center=(cx,cy), rhoList=range(0,9,2), sigma0=3,  alpha=0.7,
+			rotationInvariance = np.arange(12)/12*np.pi),
+		# Asymmetrical filter
+		'asymm': dict(filt=c.DoGFilter, filterArgs=(1.8, 1), prototype=proto_symm, center=(cx,cy), rhoList=range(0,23,2), sigma0=2,  alpha=0.1,
+			rotationInvariance = np.arange(24)/12*np.pi, maxPhi=np.pi),
+	}
+
+# The symmetrical and asymmetrical B-COSFIRE filters used by BCOSFIRE()
+# Fitted tuples are cached in c.registry, so only the first call fits the filters
+def fitModels(shiftMode='roll', n_jobs=1, dtype=np.float32, combiner='log', cache=None, profiler=None):
+	parameters = filterParameters()
+	options = dict(streaming=True, shiftMode=shiftMode, n_jobs=n_jobs, dtype=dtype, combiner=combiner, sharedCache=cache, profiler=profiler)
+	cosfire_symm = c.COSFIRE(c.makeStrategy(parameters['symm'], **options))
+	cosfire_asymm = c.COSFIRE(c.makeStrategy(parameters['asymm'], **options))
+	return cosfire_symm, cosfire_asymm
+
+# Evaluate a grid of filter parameters and segmentation thresholds on RGB images against their ground truth,
+# e.g. grid={'symm__sigma0': [2, 3, 4], 'asymm__filterArgs': [(1.6, 1), (1.8, 1)]}
+# Returns: the rows of the table printed by c.formatTable, see c.sweepParameters
+def sweep(images_rgb, truths, grid, masks=None, log=print, dtype=np.float32, combiner='log', **options):
+	subjects = []
+	for img_rgb in images_rgb:
+		subject = np.subtract(255, img_rgb[:,:,1], dtype=dtype)
+		subject /= 255
+		subjects.append(subject)
+	return c.sweepParameters(filterParameters(), grid, subjects, truths, masks, log=log,
+							 streaming=True, dtype=dtype, combiner=combiner, **options)
+
+# Segment an RGB image as done by the command line: the image is padded by 20 pixels
+# to get rid of the white edges in the output vessel image, and the padding is removed afterwards
+def segment(img_rgb, **options):
+	img_rgb = np.pad(img_rgb,((20,20),(20,20),(0,0)))
+	mask = np.ones(shape=img_rgb.shape[:-1])
+	resp,segresp = BCOSFIRE(img_rgb, mask, **options)
+	return resp[20:-20,20:-20], segresp[20:-20,20:-20]
+
+
+## Batch processing
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.ppm')
+
+# Image paths for a list of directories, files and glob patterns
+def expandInputs(inputs):
+	import glob
+	paths = []
+	for item in inputs:
+		if os.path.isdir(item):
+			paths += sorted(os.path.join(item, name) for name in os.listdir(item) if name.lower().endswith(IMAGE_EXTENSIONS))
+		else:
+			paths += sorted(glob.glob(item)) if glob.has_magic(item) else [item]
+	# Drop duplicates, keeping the order
+	return list(dict.fromkeys(paths))
+
+# Output files of an image: <name>_resp and <name>_segresp for every format
+def outputPaths(path, outdir, formats):
+	name = os.path.splitext(os.path.basename(path))[0]
+	return {(kind, fmt): os.path.join(outdir, "{}_{}.{}".format(name, kind, fmt)) for kind in ('resp', 'segresp') for fmt in formats}
+
+def _initWorker(models):
+	# Share the filters fitted by the parent process
+	c.registry.models.update(models)
+
+def _segmentTimed(img_rgb, options):
+	import time
+	t0 = time.perf_counter()
+	resp, segresp = segment(img_rgb, **options)
+	return resp, segresp, time.perf_counter() - t0
+
+def _write(outputs, resp, segresp):
+	import cv2
+	for (kind, fmt), path in outputs.items():
+		image = resp if kind == 'resp' else segresp
+		# Write to a temporary file first, so an interrupted run never leaves a partial output behind
+		tmp = path + '.tmp.' + fmt
+		if fmt == 'npy':
+			np.save(tmp, image)
+			os.replace(tmp, path)
+		else:
+			cv2.imwrite(tmp, np.round(image).astype(np.uint8))
+			os.replace(tmp, path)
+
+# Segment all images, fitting the filters once and sharing them with a pool of worker processes
+# Decoding and writing run in background threads, with at most prefetch decoded images waiting
+# Images of which all outputs exist are skipped when resuming
+# With store (a directory), the outputs and responses of every image are also written to the c.ResponseStore
+# <store>/<name> (see BCOSFIRE), including the padding of segment()
+def batch(inputs, outdir, workers=1, formats=('png',), prefetch=4, resume=True, log=print, store=None, **options):
+	import queue
+	import threading
+	import time
+	import cv2
+	from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+	os.makedirs(outdir, exist_ok=True)
+	paths = expandInputs(inputs)
+	todo = [path for path in paths if not (resume and all(os.path.exists(out) for out in outputPaths(path, outdir, formats).values()))]
+	log("{} image(s), {} to process, {} already done".format(len(paths), len(todo), len(paths)-len(todo)))
+	if not todo:
+		return {'images': 0, 'skipped': len(paths), 'failed': 0, 'seconds': 0.0}
+
+	# Fit the filters once, before starting the workers
+	fitModels(**options)
+
+	# Decode the images ahead of the computation
+	decoded = queue.Queue(maxsize=prefetch)
+	def read():
+		for path in todo:
+			image = cv2.imread(path, 1)
+			decoded.put( (path, None if image is None else cv2.cvtColor(image, cv2.COLOR_BGR2RGB)) )
+		decoded.put(None)
+	threading.Thread(target=read, daemon=True).start()
+
+	if workers > 1:
+		pool = ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(dict(c.registry.models),))
+	else:
+		pool = ThreadPoolExecutor(max_workers=1)
+	writer = ThreadPoolExecutor(max_workers=1)
+
+	t0 = time.perf_counter()
+	stats = {'images': 0, 'skipped': len(paths)-len(todo), 'failed': 0}
+	pending = []
+	def collect(path, future):
+		try:
+			resp, segresp, seconds = future.result()
+		except Exception as error:
+			stats['failed'] += 1
+			log("{}: failed ({})".format(path, error))
+			return
+		writes.append(writer.submit(_write, outputPaths(path, outdir, formats), resp, segresp))
+		stats['images'] += 1
+		elapsed = time.perf_counter() - t0
+		log("{}: {:.2f}s ({}/{}, {:.2f} images/s)".format(path, seconds, stats['images'], len(todo), stats['images']/elapsed))
+
+	writes = []
+	with pool, writer:
+		while True:
+			item = decoded.get()
+			if item is None:
+				break
+			path, img_rgb = item
+			if img_rgb is None:
+				stats['failed'] += 1
+				log("{}: could not be read".format(path))
+				continue
+			imageOptions = options if store is None else dict(options, store=os.path.join(store, os.path.splitext(os.path.basename(path))[0]))
+			pending.append( (path, pool.submit(_segmentTimed, img_rgb, imageOptions)) )
+			# Keep the number of images in flight bounded
+			while len(pending) > workers:
+				collect(*pending.pop(0))
+			# Limit the number of results waiting to be written, raising any write error
+			for w in [w for w in writes if w.done()]:
+				w.result()
+				writes.remove(w)
+			while len(writes) > prefetch:
+				writes.pop(0).result()
+		for item in pending:
+			collect(*item)
+		for w in writes:
+			w.result()
+
+	stats['seconds'] = time.perf_counter() - t0
+	log("Processed {} image(s) in {:.1f}s ({:.2f} images/s), {} skipped, {} failed".format(
+		stats['images'], stats['seconds'], stats['images']/stats['seconds'], stats['skipped'], stats['failed']))
+	return stats
+
+
+## Inference server
+
+# Segment RGB images of the same size as segment() does, transforming them together as one stack
+# models are the filters of fitModels(), fitted (or looked up in c.registry) if not given
+def segmentBatch(images_rgb, models=None, **options):
+	cosfire_symm, cosfire_asymm = models if models is not None else fitModels(**options)
+	green = np.stack([np.pad(img_rgb[:,:,1], 20) for img_rgb in images_rgb])
+	subjects = np.subtract(255, green, dtype=options.get('dtype', np.float32))
+	subjects /= 255
+
+	resps = cosfire_symm.transformStack(subjects) + cosfire_asymm.transformStack(subjects)
+	mask = np.ones(shape=subjects.shape[1:])
+	results = []
+	for resp in resps:
+		resp = c.rescaleImage(np.multiply(resp, mask), 0, 255)
+		segresp = np.where(resp > 37, 255, 0)
+		results.append( (resp[20:-20,20:-20], segresp[20:-20,20:-20]) )
+	return results
+
+# HTTP server segmenting the images posted to /segment, with the filters fitted once and kept in memory
+# Concurrent requests for images of the same size are segmented together, in batches of at most maxBatch
+# images; at most maxQueue requests wait, see cosfire.server. The response is segresp, or resp with
+# ?output=resp, as PNG, or as a NumPy array with ?format=npy. With a profiler (option profiler), its
+# aggregated stages are included in the metrics.
+def inferenceServer(host='127.0.0.1', port=8080, maxBatch=8, maxDelay=0.01, maxQueue=32, **options):
+	import io
+	import cv2
+	from cosfire.server import MicroBatcher, makeServer
+	models = fitModels(**options)
+
+	def decode(body, query):
+		image = cv2.imdecode(np.frombuffer(body, np.uint8), 1)
+		if image is None:
+			raise ValueError("The request body is not an image")
+		img_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+		return img_rgb.shape, img_rgb
+
+	def encode(result, query):
+		resp, segresp = result
+		output = query.get('output', 'segresp')
+		if output not in ('resp', 'segresp'):
+			raise ValueError("Unknown output '{}'".format(output))
+		image = resp if output == 'resp' else segresp
+		fmt = query.get('format', 'png')
+		if fmt == 'npy':
+			buffer = io.BytesIO()
+			np.save(buffer, image)
+			return 'application/octet-stream', buffer.getvalue()
+		if fmt == 'png':
+			return 'image/png', cv2.imencode('.png', np.round(image).astype(np.uint8))[1].tobytes()
+		raise ValueError("Unknown format '{}'".format(fmt))
+
+	profiler = options.get('profiler')
+	extraStats = (lambda: {'profile': profiler.stats()}) if profiler is not None else None
+	batcher = MicroBatcher(lambda images: segmentBatch(images, models, **options), maxBatch, maxDelay, maxQueue).start()
+	return makeServer(batcher, decode, encode, host, port, extraStats=extraStats)
+
+def serve(argv):
+	import argparse
+	parser = argparse.ArgumentParser(description="Serve the B-COSFIRE vessel segmentation over HTTP")
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8080)
+	parser.add_argument('--max-batch', type=int, default=8, help="largest number of images segmented at once")
+	parser.add_argument('--max-delay', type=float, default=10, help="milliseconds a request waits for others of the same size")
+	parser.add_argument('--max-queue', type=int, default=32, help="number of waiting requests before new ones are rejected")
+	parser.add_argument('--n-jobs', type=int, default=1, help="number of threads per batch")
+	parser.add_argument('--shift-mode', choices=['roll', 'window'], default='roll')
+	parser.add_argument('--dtype', choices=['float32', 'float64'], default='float32')
+	parser.add_argument('--combiner', choices=['product', 'log', 'weighted'], default='log')
+	parser.add_argument('--profile', action='store_true', help="include the time spent in every stage in the metrics")
+	args = parser.parse_args(argv)
+	server = inferenceServer(args.host, args.port, args.max_batch, args.max_delay/1000, args.max_queue, n_jobs=args.n_jobs,
+							 shiftMode=args.shift_mode, dtype=np.dtype(args.dtype).type, combiner=args.combiner,
+							 profiler=c.Profiler() if args.profile else None)
+	print("Serving on http://{}:{}/segment, metrics on /metrics".format(*server.server_address))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		server.batcher.stop()
+	return 0
+
+## Frame streams
+
+# Segment a stream of RGB frames of the same shape (e.g. the frames of a fundus video) as BCOSFIRE() does, yielding
+# (resp, segresp) for every frame. The full frames are transformed (see CircleStrategy.transformStream), and the
+# responses multiplied by the mask if given. All arrays are allocated for the first frame and reused for the later
+# ones, so the yielded arrays are overwritten by the next frame: copy them to keep them.
+# stats (a dict) is updated with the number of frames, the seconds spent on the first frame and on the later
+# ones, the sustained frames per second over the later frames, and the bytes of all arrays allocated
+def segmentStream(frames_rgb, mask=None, stats=None, **options):
+	import time
+	cosfire_symm, cosfire_asymm = fitModels(**options)
+	dtype = options.get('dtype', np.float32)
+	stats = c.streamStats(stats)
+	workspace = None
+	for img_rgb in frames_rgb:
+		t0 = time.perf_counter()
+		if workspace is None or not workspace.matches(img_rgb.shape[:2]):
+			workspace = c.Workspace(img_rgb.shape[:2], dtype)
+			spaces = (c.Workspace(img_rgb.shape[:2], dtype), c.Workspace(img_rgb.shape[:2], dtype))
+
+		subject = workspace.array('subject')
+		np.subtract(255, img_rgb[:,:,1], out=subject, dtype=dtype)
+		subject /= 255
+
+		# In the type of the product with the mask, as in BCOSFIRE()
+		resp = workspace.array('resp', dtype=np.result_type(dtype, mask) if mask is not None else dtype)
+		np.add(cosfire_symm.transformFrame(subject, spaces[0]), cosfire_asymm.transformFrame(subject, spaces[1]), out=resp)
+		if mask is not None:
+			np.multiply(resp, mask, out=resp)
+		c.rescaleImage(resp, 0, 255, out=resp)
+		vessel = workspace.array('vessel', dtype=bool)
+		segresp = workspace.array('segresp', dtype=np.int_)
+		np.greater(resp, 37, out=vessel)
+		np.multiply(vessel, 255, out=segresp)
+
+		c.recordFrame(stats, time.perf_counter() - t0, workspace, *spaces)
+		yield resp, segresp
+
+# Frames of a video file, or of the images given as for batch(), as RGB arrays
+# The frames of a video are decoded into the same arrays, which the next frame overwrites
+def readFrames(inputs):
+	import cv2
+	if len(inputs) == 1 and os.path.isfile(inputs[0]) and not inputs[0].lower().endswith(IMAGE_EXTENSIONS):
+		capture = cv2.VideoCapture(inputs[0])
+		if not capture.isOpened():
+			raise ValueError("Cannot open the video '{}'".format(inputs[0]))
+		(frame, rgb) = (None, None)
+		try:
+			while True:
+				ok, frame = capture.read(frame)
+				if not ok:
+					return
+				rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+				yield rgb
+		finally:
+			capture.release()
+	for path in expandInputs(inputs):
+		yield cv2.cvtColor(cv2.imread(path, 1), cv2.COLOR_BGR2RGB)
+
+def stream(argv):
+	import argparse
+	import cv2
+	parser = argparse.ArgumentParser(description="Segment the frames of a video or an image sequence with the B-COSFIRE filters")
+	parser.add_argument('inputs', nargs='+', help="a video file, or directories, image files or glob patterns of frames of the same size")
+	parser.add_argument('-o', '--output', help="directory to write segresp of every frame to, as frame_<number>.png")
+	parser.add_argument('--mask', help="image of which the non-zero pixels are the field of view")
+	parser.add_argument('--report', type=int, default=100, help="print the frame rate every this many frames")
+	parser.add_argument('--shift-mode', choices=['roll', 'window'], default='roll')
+	parser.add_argument('--dtype', choices=['float32', 'float64'], default='float32')
+	parser.add_argument('--combiner', choices=['product', 'log', 'weighted'], default='log')
+	args = parser.parse_args(argv)
+	mask = cv2.imread(args.mask, 0) > 0 if args.mask else None
+	if args.output:
+		os.makedirs(args.output, exist_ok=True)
+
+	stats = {}
+	frames = segmentStream(readFrames(args.inputs), mask, stats, shiftMode=args.shift_mode,
+						   dtype=np.dtype(args.dtype).type, combiner=args.combiner)
+	for index, (resp, segresp) in enumerate(frames):
+		if args.output:
+			cv2.imwrite(os.path.join(args.output, "frame_{:06d}.png".format(index)), segresp.astype(np.uint8))
+		if (index+1) % args.report == 0:
+			print("{} frames, {:.2f} frames/s".format(index+1, stats['fps']))
+	print("{} frames, first frame {:.2f}s, {:.2f} frames/s sustained".format(stats['frames'], stats['firstSeconds'], stats['fps']))
+	return 0
+
+def main(argv):
+	import argparse
+	parser = argparse.ArgumentParser(description="Segment the vessels in images with the B-COSFIRE filters")
+	parser.add_argument('inputs', nargs='+', help="directories, image files or glob patterns")
+	parser.add_argument('-o', '--output', required=True, help="output directory")
+	parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help="number of worker processes (default: all CPUs)")
+	parser.add_argument('-f', '--format', nargs='+', choices=['png', 'npy'], default=['png'], help="output formats of resp and segresp")
+	parser.add_argument('--prefetch', type=int, default=4, help="number of decoded images and results waiting in the queues")
+	parser.add_argument('--no-resume', dest='resume', action='store_false', help="recompute images of which the outputs exist")
+	parser.add_argument('--store', help="directory to write a store of the filter and orientation responses of every image to")
+	parser.add_argument('--shift-mode', choices=['roll', 'window'], default='roll')
+	parser.add_argument('--dtype', choices=['float32', 'float64'], default='float32')
+	parser.add_argument('--combiner', choices=['product', 'log', 'weighted'], default='log')
+	args = parser.parse_args(argv)
+	stats = batch(args.inputs, args.output, workers=args.workers, formats=args.format, prefetch=args.prefetch, resume=args.resume, store=args.store,
+				  shiftMode=args.shift_mode, dtype=np.dtype(args.dtype).type, combiner=args.combiner)
+	return 1 if stats['failed'] else 0
+
 
 if __name__ == '__main__':
 	import sys
+	if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+		sys.exit(main(sys.argv[2:]))
+	if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+		sys.exit(serve(sys.argv[2:]))
+	if len(sys.argv) > 1 and sys.argv[1] == 'stream':
+		sys.exit(stream(sys.argv[2:]))
+
 	import cv2
 	import matplotlib.pyplot as plt
 	img_rgb = cv2.cvtColor(cv2.imread(sys.argv[1],1), cv2.COLOR_BGR2RGB)
-	img_rgb = np.pad(img_rgb,((20,20),(20,20),(0,0))) # Add some padding to get rid of the white edges in the output vessel image
-	mask = np.ones(shape=img_rgb.shape[:-1])
 
-	resp,segresp = BCOSFIRE(img_rgb,mask)
-	resp = resp[20:-20,20:-20] # Remove padding
+	resp,segresp = segment(img_rgb)
 	p_vessel = resp/np.amax(resp)
 	# plt.imsave('./figures/sample_0_out.png',p_vessel,cmap='gray')
 	plt.imshow(p_vessel,cmap='gray')
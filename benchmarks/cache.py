@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+""" 
+Benchmark of the response cache: the asymmetric B-COSFIRE filter of BCOSFIRE.py on a synthetic image with increasing
+memory budgets, as a multiple of the size of one blurred response. Reports the time, the peak memory traced during
+the transform and the hit/miss/eviction counters of the cache for both eviction policies. The responses must be
+bit-identical to the unbounded cache, and no budget may raise the peak memory above that of the unbounded cache by
+more than one response (the filter response, kept to blur evicted responses again) plus PEAK_SLACK; the exit code is
+1 otherwise.
+
+Usage: python benchmarks/cache.py [size ...]
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import sys
+import numpy as np
+
+from common import asymmetricStrategy, syntheticVessels, subjectOf, measure
+
+# Peak memory (in bytes) a budgeted run may use above the unbounded run
+PEAK_SLACK = 2**20
+
+
+def main(sizes):
+    print("{:>6} {:>8} {:>8} {:>10} {:>12} {:>6} {:>6} {:>9} {:>10}".format(
+        'size', 'budget', 'policy', 'time (s)', 'peak (MB)', 'hits', 'misses', 'evictions', 'identical'))
+    failed = False
+    for size in sizes:
+        subject = subjectOf(syntheticVessels(size)[0])
+        responseBytes = subject.nbytes
+        (reference, referencePeak) = (None, None)
+        for budget in [None, 16, 8, 4]:
+            for policy in (['plan'] if budget is None else ['plan', 'lru']):
+                strategy = asymmetricStrategy(streaming=True, cacheBudget=budget and budget*responseBytes, cachePolicy=policy)
+                result, seconds, peak = measure(strategy.transform, subject)
+                if reference is None:
+                    (reference, referencePeak) = (result, peak)
+                stats = strategy.cache.stats()
+                identical = np.array_equal(result, reference)
+                bounded = peak <= referencePeak + responseBytes + PEAK_SLACK
+                print("{:>6} {:>8} {:>8} {:>10.3f} {:>12.1f}{} {:>6} {:>6} {:>9} {:>10}".format(
+                    size, 'none' if budget is None else '{}x'.format(budget), policy, seconds, peak/2**20,
+                    '' if bounded else '!', stats['hits'], stats['misses'], stats['evictions'], str(identical)))
+                failed = failed or not identical or not bounded
+    if failed:
+        print("Failed: a budgeted run differs from the unbounded cache or uses more memory (marked '!')")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main([int(size) for size in sys.argv[1:]] or [1024]))
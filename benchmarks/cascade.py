@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""
+Check of the blur cascade (blurCascade=True): the symmetrical filter of BCOSFIRE.py, of which the largest blur is
+the only one computed from a smaller one (sigma 1.433 from 0.967), and the asymmetrical filter with the larger blurs
+of sigma0=18 and alpha=4.2, of which most blurs are. With the cascade, the lazy (cacheBudget), masked and point paths
+must be bit-identical to the full transform, and the full transform must match the direct blurring to within
+TOLERANCE of its maximum. Prints the blurs computed from a smaller one and the largest differences; the exit code is
+1 if a check fails.
+
+Usage: python benchmarks/cascade.py [size]
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import sys
+import numpy as np
+
+from common import syntheticVessels, subjectOf, symmetricStrategy, asymmetricStrategy
+
+# Largest difference with the direct blurring, as a fraction of the maximum response
+TOLERANCE = 0.01
+
+
+# Fitted strategies to check, made with the given keyword arguments
+def strategies():
+    return {
+        'symmetric': symmetricStrategy,
+        'asymmetric 18/4.2': lambda **kwargs: asymmetricStrategy(sigma0=18, alpha=4.2, **kwargs),
+    }
+
+def main(size):
+    subject = subjectOf(syntheticVessels(size)[0])
+    mask = np.zeros(subject.shape, bool)
+    mask[size//4:size//2, size//8:size*3//4] = True
+    coords = np.random.default_rng(0).integers(0, size, (500, 2))
+    failed = False
+    for name, make in strategies().items():
+        strategy = make(blurCascade=True)
+        cascaded = {sigma: base for plan in strategy.blurPlans().values() for sigma, (base, increment, path) in plan.items() if base is not None}
+        print("{}: {}".format(name, ', '.join('{:.3f} from {:.3f}'.format(sigma, base) for sigma, base in sorted(cascaded.items())) or 'no cascade'))
+        failed = failed or not cascaded
+
+        expected = strategy.transform(subject)
+        # Differences with the full transform
+        checks = {
+            'lazy': lambda: make(blurCascade=True, cacheBudget=4*subject.nbytes).transform(subject) - expected,
+            'masked': lambda: (make(blurCascade=True).transform(subject, mask) - expected)[mask],
+            'points': lambda: make(blurCascade=True).transformPoints(subject, coords) - expected[coords[:,1], coords[:,0]],
+        }
+        for check, run in checks.items():
+            difference = float(np.max(np.abs(run())))
+            print("{:>20} {:>10} {:>10.3g}".format(name, check, difference))
+            failed = failed or difference != 0
+
+        direct = make().transform(subject)
+        relative = float(np.max(np.abs(expected - direct))/np.max(np.abs(direct)))
+        print("{:>20} {:>10} {:>10.3g} of the maximum".format(name, 'direct', relative))
+        failed = failed or relative > TOLERANCE
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 512))
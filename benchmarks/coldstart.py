@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""
+Cold-start benchmark: the wall time of fresh Python processes importing NumPy (the floor), importing cosfire, printing
+the help of BCOSFIRE.py, and segmenting a single synthetic image with `python BCOSFIRE.py batch`, which includes
+fitting the filters. Every command is run --repeat times and the median is reported.
+
+The import of cosfire is checked against IMPORT_BUDGET seconds, and none of the LAZY_MODULES may be imported by it:
+they are only imported by the features that need them. The exit code is 1 if a check fails. With --details, the
+modules taking the most time to import are listed (see python -X importtime).
+
+Usage: python benchmarks/coldstart.py [--repeat 5] [--size 512] [--details]
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from common import cv2, syntheticVessels
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Largest median time (seconds) of a process importing cosfire
+IMPORT_BUDGET = 0.5
+
+# Modules that importing cosfire must not import
+LAZY_MODULES = ['sklearn', 'scipy', 'matplotlib']
+
+
+# Median wall time of running a command in a fresh process
+def coldSeconds(command, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times))
+
+# Modules imported by a fresh process importing cosfire, with their cumulative import time in seconds
+def importTimes():
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import cosfire'], cwd=ROOT, check=True, capture_output=True, text=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            (_, cumulative, name) = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)/1e6
+    return times
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Measure the start-up time of cosfire and BCOSFIRE.py in fresh processes")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--size', type=int, default=512, help="size of the synthetic image segmented by the batch command")
+    parser.add_argument('--details', action='store_true', help="list the modules taking the most time to import")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        image = os.path.join(directory, 'frame.png')
+        cv2.imwrite(image, cv2.cvtColor(syntheticVessels(args.size)[0], cv2.COLOR_RGB2BGR))
+        commands = {
+            'import numpy': [sys.executable, '-c', 'import numpy'],
+            'import cosfire': [sys.executable, '-c', 'import cosfire'],
+            'BCOSFIRE.py --help': [sys.executable, 'BCOSFIRE.py', 'batch', '--help'],
+            'BCOSFIRE.py batch': [sys.executable, 'BCOSFIRE.py', 'batch', image, '-o', os.path.join(directory, 'output'), '--workers', '1', '--no-resume'],
+        }
+        seconds = {name: coldSeconds(command, args.repeat) for name, command in commands.items()}
+
+    for name, value in seconds.items():
+        print("{:>20} {:>8.3f}s".format(name, value))
+
+    times = importTimes()
+    loaded = [name for name in LAZY_MODULES if name in times]
+    failed = False
+    if seconds['import cosfire'] > IMPORT_BUDGET:
+        print("Importing cosfire takes {:.3f}s, over the budget of {}s".format(seconds['import cosfire'], IMPORT_BUDGET))
+        failed = True
+    if loaded:
+        print("Importing cosfire imports {}".format(", ".join(loaded)))
+        failed = True
+    if args.details:
+        for name, value in sorted(times.items(), key=lambda item: -item[1])[:15]:
+            print("{:>40} {:>8.3f}s".format(name, value))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+""" 
+This module provides helpers shared by the benchmark scripts: synthetic vessel-like test images, the B-COSFIRE filter
+configurations used by BCOSFIRE.py and simple timing/memory measurements.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import cv2
+import cosfire as c
+from BCOSFIRE import filterParameters
+
+# Generate a fundus-like RGB image of size x size pixels with a tree of dark curvilinear vessels
+# Returns: (RGB uint8 image, boolean vessel mask)
+def syntheticVessels(size, seed=0):
+    rng = np.random.default_rng(seed)
+    vessels = np.zeros((size, size), np.uint8)
+    scale = size/512
+    for _ in range(int(24*scale)):
+        # Random walk with smoothly varying direction and a width that tapers off
+        x, y = rng.uniform(0, size, 2)
+        angle = rng.uniform(0, 2*np.pi)
+        width = rng.uniform(1, 6)*scale**0.5
+        for _ in range(int(rng.uniform(40, 120)*scale)):
+            angle += rng.normal(0, 0.15)
+            nx, ny = x + 4*np.cos(angle), y + 4*np.sin(angle)
+            cv2.line(vessels, (int(x), int(y)), (int(nx), int(ny)), 255, max(1, int(round(width))))
+            x, y, width = nx, ny, max(1, width*0.995)
+    background = np.fromfunction(lambda i, j: 1 - 0.5*(((i-size/2)**2 + (j-size/2)**2)/(size/2)**2), (size, size))
+    green = 160*background - 70*cv2.GaussianBlur(vessels/255, (0, 0), 1.0) + rng.normal(0, 4, (size, size))
+    green = np.clip(green, 0, 255).astype(np.uint8)
+    rgb = np.dstack([np.clip(green*1.5, 0, 255).astype(np.uint8), green, (green*0.4).astype(np.uint8)])
+    return rgb, vessels > 0
+
+# The symmetric and asymmetric strategies of BCOSFIRE.py (see filterParameters), fitted through the model registry
+# The keyword arguments replace parameters or add options of CircleStrategy
+def symmetricStrategy(**kwargs):
+    return c.makeStrategy(filterParameters()['symm'], **kwargs)
+
+def asymmetricStrategy(**kwargs):
+    return c.makeStrategy(filterParameters()['asymm'], **kwargs)
+
+# Area under the ROC curve of the response for the boolean truth (Mann-Whitney U statistic)
+def auc(response, truth):
+    ranks = np.empty(response.size)
+    ranks[np.argsort(response, axis=None, kind='stable')] = np.arange(1, response.size+1)
+    positives = truth.ravel()
+    n = positives.sum()
+    return (ranks[positives].sum() - n*(n+1)/2) / (n*(positives.size-n))
+
+# Green-channel subject as computed in BCOSFIRE()
+def subjectOf(rgb):
+    return (255 - rgb[:,:,1])/255
+
+# Run func(*args) and measure its wall time
+# Returns: (result, seconds)
+def timed(func, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+# Run func(*args) and measure its wall time and peak traced memory
+# Tracing slows down allocations, use timed() when only the time matters
+# Returns: (result, seconds, peak bytes)
+def measure(func, *args, **kwargs):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+"""
+Check of the scikit-learn estimator interface of the filters: the DoG, Gaussian and B-COSFIRE filters are fitted and
+applied in a scikit-learn pipeline, with fit_transform, after sklearn.base.clone and after a round trip of their
+parameters through get_params and set_params, and their outputs compared with transform(). Every check prints its
+largest difference; the exit code is 1 if a check fails. Requires scikit-learn.
+
+Usage: python benchmarks/estimator.py [size]
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import sys
+import numpy as np
+
+from common import c, syntheticVessels, subjectOf, symmetricStrategy
+
+
+# Estimators to check, unfitted
+def estimators():
+    return {
+        'DoGFilter': c.DoGFilter(2.4, 1),
+        'GaussianFilter': c.GaussianFilter(2),
+        'COSFIRE': c.COSFIRE(symmetricStrategy()),
+    }
+
+def main(size):
+    from sklearn.base import clone
+    from sklearn.pipeline import make_pipeline
+
+    subject = subjectOf(syntheticVessels(size)[0])
+    failed = False
+    for name, make in [(name, lambda name=name: estimators()[name]) for name in estimators()]:
+        expected = make().fit(subject).transform(subject)
+        checks = {
+            'fit_transform': lambda: make().fit_transform(subject),
+            'pipeline': lambda: make_pipeline(make()).fit(subject).transform(subject),
+            'clone': lambda: clone(make()).fit(subject).transform(subject),
+            'set_params': lambda: make().set_params(**make().get_params(deep=False)).fit(subject).transform(subject),
+        }
+        for check, run in checks.items():
+            try:
+                difference = float(np.max(np.abs(run() - expected)))
+            except Exception as error:
+                print("{:>15} {:>15} failed ({}: {})".format(name, check, type(error).__name__, error))
+                failed = True
+                continue
+            print("{:>15} {:>15} {:>10.3g}".format(name, check, difference))
+            failed = failed or difference != 0
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 256))
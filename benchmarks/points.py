@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+""" 
+Benchmark of the point queries: the asymmetric B-COSFIRE filter of BCOSFIRE.py evaluated with transformPoints at an
+increasing number of random pixels of a synthetic image, against the dense transform. The responses at the points
+must be bit-identical to the dense response.
+
+Usage: python benchmarks/points.py [size]
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import sys
+import numpy as np
+
+from common import asymmetricStrategy, syntheticVessels, subjectOf, timed
+
+
+def main(size):
+    subject = subjectOf(syntheticVessels(size)[0])
+    rng = np.random.default_rng(0)
+    print("{:>8} {:>8} {:>10} {:>10}".format('points', 'mode', 'time (s)', 'identical'))
+    for mode in ['roll', 'window']:
+        strategy = asymmetricStrategy(streaming=True, shiftMode=mode)
+        dense, seconds = timed(strategy.transform, subject)
+        print("{:>8} {:>8} {:>10.3f} {:>10}".format('dense', mode, seconds, ''))
+        for n in [100, 1000, 10000]:
+            points = np.stack([rng.integers(0, size, n), rng.integers(0, size, n)], axis=1)
+            responses, seconds = timed(strategy.transformPoints, subject, points)
+            print("{:>8} {:>8} {:>10.3f} {:>10}".format(n, mode, seconds, str(np.array_equal(responses, dense[points[:,1], points[:,0]]))))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1024)
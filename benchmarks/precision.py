@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+""" 
+Accuracy and speed of the compute modes of BCOSFIRE() against the float64 reference (dtype=np.float64, product
+combiner). For every mode the end-to-end response (0-255) is compared: maximum and 99.9th percentile absolute error,
+and the number of pixels of the segmentation that differ.
+
+Usage: python benchmarks/precision.py [image ...]   (synthetic 1024x1024 vessels when no image is given)
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import sys
+import numpy as np
+
+from common import syntheticVessels, measure
+import cv2
+from BCOSFIRE import BCOSFIRE
+
+MODES = [
+    ('float64', 'log'),
+    ('float32', 'product'),
+    ('float32', 'log'),
+    ('float32', 'weighted'),
+]
+
+
+def main(paths):
+    images = [(path, cv2.cvtColor(cv2.imread(path, 1), cv2.COLOR_BGR2RGB)) for path in paths] or [('synthetic', syntheticVessels(1024)[0])]
+    print("{:>12} {:>8} {:>9} {:>9} {:>10} {:>10} {:>8}".format('image', 'dtype', 'combiner', 'seconds', 'max err', 'p99.9 err', 'seg diff'))
+    for name, img_rgb in images:
+        mask = np.ones(shape=img_rgb.shape[:-1])
+        (resp, segresp), seconds, _ = measure(BCOSFIRE, img_rgb, mask, dtype=np.float64)
+        print("{:>12} {:>8} {:>9} {:>9.3f} {:>10} {:>10} {:>8}".format(name[-12:], 'float64', 'product', seconds, '-', '-', '-'))
+        for dtype, combiner in MODES:
+            (curResp, curSegresp), seconds, _ = measure(BCOSFIRE, img_rgb, mask, dtype=np.dtype(dtype).type, combiner=combiner)
+            error = np.abs(curResp - resp)
+            print("{:>12} {:>8} {:>9} {:>9.3f} {:>10.3g} {:>10.3g} {:>8}".format(
+                name[-12:], dtype, combiner, seconds, error.max(), np.percentile(error, 99.9), np.count_nonzero(curSegresp != segresp)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
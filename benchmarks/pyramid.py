@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+""" 
+Benchmark of the coarse-to-fine pyramid mode: the B-COSFIRE filters of BCOSFIRE.py applied with transformPyramid
+(which requires shiftMode='window') against the full-resolution transform, for several downsampling factors and refinement thresholds. Reports the
+speedup, the refined fraction of the image, and the accuracy loss: the mean and maximum difference of the combined
+response rescaled to [0, 255] as in BCOSFIRE(), and the fraction of pixels of which the segmentation (threshold 37)
+changes. For synthetic images the AUC against the vessel mask is reported as well. Configurations of which the
+refined windows cover too much of the image fall back to the full transform (see MAX_REFINED_AREA), marked with *.
+With sparse<size>, only a quarter of the synthetic image holds vessels, as e.g. for a lesion or a crop of interest;
+the pyramid only pays off on such sparse images.
+
+Usage: python benchmarks/pyramid.py [image, size or sparse<size>]
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import sys
+import numpy as np
+
+from common import c, cv2, auc, syntheticVessels, symmetricStrategy, asymmetricStrategy, subjectOf, timed
+
+
+# A size x size image of which only the top-left quarter holds vessels (those of a synthetic image of half the
+# size), drawn as in syntheticVessels on a flat noisy background
+def sparseVessels(size, seed=0):
+    truth = np.zeros((size, size), bool)
+    truth[:size//2, :size//2] = syntheticVessels(size//2, seed)[1]
+    rng = np.random.default_rng(seed)
+    green = 140 - 70*cv2.GaussianBlur(truth.astype(np.float64), (0, 0), 1.0) + rng.normal(0, 4, (size, size))
+    green = np.clip(green, 0, 255).astype(np.uint8)
+    rgb = np.dstack([np.clip(green*1.5, 0, 255).astype(np.uint8), green, (green*0.4).astype(np.uint8)])
+    return rgb, truth
+
+def main(source):
+    if source.isdigit():
+        rgb, truth = syntheticVessels(int(source))
+    elif source.startswith('sparse') and source[len('sparse'):].isdigit():
+        rgb, truth = sparseVessels(int(source[len('sparse'):]))
+    else:
+        rgb, truth = cv2.cvtColor(cv2.imread(source, 1), cv2.COLOR_BGR2RGB), None
+    subject = subjectOf(rgb).astype(np.float32)
+
+    print("{:>7} {:>9} {:>10} {:>8} {:>8} {:>10} {:>10} {:>8} {:>7}".format(
+        'factor', 'threshold', 'time (s)', 'speedup', 'refined', 'mean diff', 'max diff', 'seg diff', 'AUC'))
+    kwargs = dict(shiftMode='window', streaming=True, dtype=np.float32, combiner='log')
+    strategies = [symmetricStrategy(**kwargs), asymmetricStrategy(**kwargs)]
+    full, fullSeconds = timed(lambda: c.rescaleImage(sum(s.transform(subject) for s in strategies), 0, 255))
+    print("{:>7} {:>9} {:>10.3f} {:>8} {:>8} {:>10} {:>10} {:>8} {:>7}".format(
+        'full', '', fullSeconds, '', '', '', '', '', '' if truth is None else '{:.4f}'.format(auc(full, truth))))
+    for factor in [0.5, 0.25]:
+        for threshold in [0.05, 0.1, 0.2]:
+            pyramid, seconds = timed(lambda: c.rescaleImage(sum(s.transformPyramid(subject, factor, threshold) for s in strategies), 0, 255))
+            refined = np.mean([s.pyramidStats['refined'] for s in strategies])
+            fallback = '*' if any(s.pyramidStats['fallback'] for s in strategies) else ''
+            print("{:>7} {:>9} {:>10.3f} {:>7.2f}x {:>8} {:>10.3f} {:>10.1f} {:>8.2%} {:>7}".format(
+                factor, threshold, seconds, fullSeconds/seconds, '{:.0%}{}'.format(refined, fallback), np.mean(np.abs(pyramid-full)),
+                np.max(np.abs(pyramid-full)), np.mean((pyramid > 37) != (full > 37)),
+                '' if truth is None else '{:.4f}'.format(auc(pyramid, truth))))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else '1024')
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+""" 
+Benchmark of the shift modes of CircleStrategy: 'roll' (np.roll copies, wrapping around the border) against 'window'
+(offset views into a zero-padded response buffer). Both are run in streaming mode on the asymmetric filter of BCOSFIRE.py.
+The outputs are compared away from the border, where the two modes must agree exactly.
+
+Usage: python benchmarks/shift_modes.py [size ...]
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import sys
+import numpy as np
+
+from common import syntheticVessels, asymmetricStrategy, subjectOf, measure
+
+
+def main(sizes):
+    print("{:>6} {:>8} {:>10} {:>12} {:>14}".format('size', 'mode', 'seconds', 'peak MiB', 'interior diff'))
+    for size in sizes:
+        subject = subjectOf(syntheticVessels(size)[0])
+        results = {}
+        for mode in ['roll', 'window']:
+            strategy = asymmetricStrategy(streaming=True, shiftMode=mode)
+            results[mode], seconds, peak = measure(strategy.transform, subject)
+            m = strategy.maxShift()
+            diff = np.abs(results[mode] - results['roll'])[m:-m, m:-m].max()
+            print("{:>6} {:>8} {:>10.3f} {:>12.1f} {:>14.3g}".format(size, mode, seconds, peak/2**20, diff))
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [512, 1024, 2048])
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""
+Benchmark of the response store: a synthetic image segmented with BCOSFIRE() without a store, and exporting its
+responses to a c.ResponseStore with several compressions and quantizations. Reports the export overhead, the size
+of the stored responses against the responses in float32, the time to read one tile of all orientations and one
+orientation of the symmetrical filter back from disk against transforming the image again, and the largest error of
+the stored orientation responses.
+
+Usage: python benchmarks/store.py [size]
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import sys
+import tempfile
+import numpy as np
+
+from common import c, syntheticVessels, subjectOf, timed
+from BCOSFIRE import BCOSFIRE, fitModels
+
+
+def main(size):
+    rgb = syntheticVessels(size)[0]
+    mask = np.ones(rgb.shape[:2])
+    fitModels()
+    BCOSFIRE(rgb, mask)
+    _, plainSeconds = timed(lambda: BCOSFIRE(rgb, mask))
+
+    # Reference orientation responses, and the time to compute them again
+    strategy = fitModels()[0].strategy
+    orientations = []
+    strategy.recorder = lambda strategy, kind, key, response: orientations.append(response.copy()) if kind == 'orientation' else None
+    _, transformSeconds = timed(lambda: strategy.transform(subjectOf(rgb).astype(np.float32)))
+    orientations = np.array(orientations)
+
+    print("{:>12} {:>9} {:>10} {:>10} {:>10} {:>8} {:>12} {:>12} {:>10}".format(
+        'compression', 'quantize', 'time (s)', 'overhead', 'size (MB)', 'ratio', 'tile (ms)', 'layer (ms)', 'max error'))
+    for compression, quantize in [(None, None), (None, 'float16'), ('zlib', None), ('zlib', 'float16')]:
+        with tempfile.TemporaryDirectory() as directory:
+            store = c.ResponseStore(directory, 'w')
+            _, seconds = timed(lambda: BCOSFIRE(rgb, mask, store=store, storeOptions=dict(quantize=quantize, compression=compression)))
+            store.close()
+
+            responses = [store[name] for name in store.names() if name not in ('resp', 'segresp')]
+            rawBytes = sum(int(np.prod(array.shape))*4 for array in responses)
+            storedBytes = sum(array.nbytes() for array in responses)
+            stored = c.ResponseStore(directory)['symm/orientations']
+            tile, tileSeconds = timed(lambda: stored[:, :256, :256])
+            layer, layerSeconds = timed(lambda: stored[len(stored)//2])
+            error = float(np.max(np.abs(stored[...] - orientations)))
+            print("{:>12} {:>9} {:>10.3f} {:>9.2f}x {:>10.1f} {:>7.2f}x {:>12.1f} {:>12.1f} {:>10.2g}".format(
+                str(compression), str(quantize), seconds, seconds/plainSeconds, storedBytes/2**20, rawBytes/storedBytes,
+                tileSeconds*1e3, layerSeconds*1e3, error))
+    print("Transforming the image again with the symmetrical filter takes {:.1f} ms".format(transformSeconds*1e3))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1024)
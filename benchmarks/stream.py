@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""
+Benchmark of the frame-stream mode: a sequence of synthetic frames of the same size segmented with BCOSFIRE() frame by
+frame, against segmentStream() reusing the arrays allocated for the first frame. Reports the sustained frames per
+second, the memory allocated per frame (the peak traced by tracemalloc while segmenting a frame after the first),
+the size of the workspaces of the stream, and the largest difference between both outputs.
+
+Usage: python benchmarks/stream.py [size] [frames]
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+from common import syntheticVessels
+from BCOSFIRE import BCOSFIRE, segmentStream, fitModels
+
+
+# Peak memory traced while taking the next item of an iterator
+def tracedNext(iterator):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = tracemalloc.get_traced_memory()[0]
+    item = next(iterator)
+    peak = tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+    return item, peak
+
+def main(size, count):
+    frames = [syntheticVessels(size, seed)[0] for seed in range(count)]
+    mask = np.ones(frames[0].shape[:2])
+
+    print("{:>8} {:>10} {:>10} {:>15} {:>15} {:>10}".format('mode', 'method', 'frames/s', 'per frame (MB)', 'workspace (MB)', 'max diff'))
+    for mode in ['roll', 'window']:
+        options = dict(shiftMode=mode)
+        fitModels(**options)
+
+        # Frame by frame; as for the stream, the first frame is not timed
+        outputs = [BCOSFIRE(frames[0], mask, **options)]
+        t0 = time.perf_counter()
+        outputs += [BCOSFIRE(rgb, mask, **options) for rgb in frames[1:]]
+        fps = (count-1)/(time.perf_counter() - t0)
+        allocated = tracedNext(BCOSFIRE(rgb, mask, **options) for rgb in frames[1:2])[1]
+        print("{:>8} {:>10} {:>10.2f} {:>15.1f} {:>15} {:>10}".format(mode, 'BCOSFIRE', fps, allocated/2**20, '', ''))
+
+        stats = {}
+        difference = 0.0
+        for (resp, segresp), (expected, _) in zip(segmentStream(frames, mask, stats, **options), outputs):
+            difference = max(difference, float(np.max(np.abs(resp - expected))))
+
+        # The peak traced while segmenting the frames after the first, in a separate run as tracing slows it down
+        stream = segmentStream(frames, mask, **options)
+        next(stream)
+        allocated = max(tracedNext(stream)[1] for _ in range(count-1))
+        print("{:>8} {:>10} {:>10.2f} {:>15.3f} {:>15.1f} {:>10.3g}".format(
+            mode, 'stream', stats['fps'], allocated/2**20, stats['workspaceBytes']/2**20, difference))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1024, int(sys.argv[2]) if len(sys.argv) > 2 else 8)
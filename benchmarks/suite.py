@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+
+"""
+Benchmark suite of the B-COSFIRE pipeline. For synthetic vessel images of every size and every configuration of
+BCOSFIRE() (see CONFIGS) it measures:
+
+- fit: fitting both filters (without the model registry),
+- computeResponses and shiftCombine: the time spent filtering and blurring, and shifting, combining and taking the
+  maximum, from the spans of a profiled run (see cosfire.profiling),
+- endToEnd: BCOSFIRE() with fitted models, the fastest of --repeat runs,
+- peakBytes: the peak memory traced during BCOSFIRE() (a separate run, as tracing slows down allocations).
+
+The output is checked against stored reference responses in references.npz: the means of resp (0-255) and the
+number of vessel pixels of segresp over the blocks of a REFERENCE_GRID x REFERENCE_GRID grid, and the AUC against
+the vessel mask. Configurations that only speed up the computation are checked against the exact configuration
+(float64, product combiner, roll mode); those that change the output by design (see REFERENCE_OF) against their own
+stored output, to catch regressions. The largest differences must be within the TOLERANCE.
+
+The results are written as JSON (--output). With --baseline, the end-to-end times are compared with an earlier
+results file as well. The exit code is 1 if any check fails, so the suite can gate changes on speed and correctness.
+
+Usage: python benchmarks/suite.py [--sizes 512 1024 2048 4096] [--configs name ...] [--repeat N] [--output results.json]
+                                  [--baseline results.json] [--max-slowdown 1.25] [--no-memory] [--update-references]
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+
+from common import c, cv2, auc, syntheticVessels, measure, timed
+from BCOSFIRE import BCOSFIRE, filterParameters, fitModels
+
+REFERENCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'references.npz')
+REFERENCE_GRID = 128
+SIZES = [512, 1024, 2048, 4096]
+
+# Options of BCOSFIRE() for every configuration
+CONFIGS = {
+    'reference': dict(dtype=np.float64, combiner='product'),
+    'default': dict(),
+    'weighted': dict(combiner='weighted'),
+    'window': dict(shiftMode='window'),
+    'threads': dict(n_jobs=-1),
+}
+
+# Configuration of which the stored output is the reference of a configuration, 'reference' if not listed:
+# the weighted geometric mean differs from the plain one, and window mode does not wrap around the border
+REFERENCE_OF = {
+    'weighted': 'weighted',
+    'window': 'window',
+}
+
+# Largest allowed difference with the reference: of the block means of resp, of the number of
+# vessel pixels in a block of segresp, and of the AUC
+TOLERANCE = {'resp': 0.5, 'seg': 4, 'auc': 0.001}
+
+
+# Means of REFERENCE_GRID x REFERENCE_GRID blocks of an image
+def blockMeans(image):
+    return cv2.resize(np.asarray(image, np.float32), (REFERENCE_GRID, REFERENCE_GRID), interpolation=cv2.INTER_AREA)
+
+def loadReferences():
+    if not os.path.exists(REFERENCES):
+        return {}
+    with np.load(REFERENCES) as data:
+        return {name: data[name] for name in data.files}
+
+def saveReferences(references):
+    with open(REFERENCES, 'wb') as f:
+        np.savez_compressed(f, **references)
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+# Time fitting both filters of BCOSFIRE() without the model registry
+def fitSeconds(options):
+    seconds = 0.0
+    for parameters in filterParameters().values():
+        parameters = {name: value for name, value in parameters.items() if name != 'maxPhi'}
+        strategy = c.CircleStrategy(**parameters, dtype=options.get('dtype', np.float32))
+        seconds += timed(strategy.fit)[1]
+    return seconds
+
+# Benchmark one configuration on one image
+# Returns: (result row, resp, segresp)
+def benchmark(name, options, rgb, repeat, memory):
+    mask = np.ones(shape=rgb.shape[:-1])
+    row = {'config': name, 'options': {key: np.dtype(value).name if key == 'dtype' else value for key, value in options.items()}}
+    row['fit'] = fitSeconds(options)
+
+    # Fit through the registry first, so only the transforms are timed
+    fitModels(**options)
+    times = []
+    for _ in range(repeat):
+        (resp, segresp), seconds = timed(BCOSFIRE, rgb, mask, **options)
+        times.append(seconds)
+    row['endToEnd'] = min(times)
+    row['endToEndRuns'] = times
+
+    profiler = c.Profiler(maxSpans=0)
+    BCOSFIRE(rgb, mask, profiler=profiler, **options)
+    stages = profiler.stats()['stages']
+    stageSeconds = lambda *names: sum(stages[stage]['seconds'] for stage in names if stage in stages)
+    row['computeResponses'] = stageSeconds('filter', 'blur')
+    row['shiftCombine'] = stageSeconds('combine', 'max')
+    row['stages'] = stages
+
+    row['peakBytes'] = measure(BCOSFIRE, rgb, mask, **options)[2] if memory else None
+    return row, resp, segresp
+
+# Reference entries of an output: the block means of resp, the vessel pixels per block of segresp and the AUC
+def referenceEntries(resp, segresp, truth):
+    blockArea = resp.size/REFERENCE_GRID**2
+    return {
+        'resp': blockMeans(resp).astype(np.float16),
+        'seg': np.round(blockMeans(segresp/255)*blockArea).astype(np.uint16),
+        'auc': np.array(auc(resp, truth)),
+    }
+
+# Compare an output with the reference of its configuration and size, adding the differences and the outcome to the row
+def check(row, size, entries, references):
+    row['auc'] = float(entries['auc'])
+    prefix = "{}/{}/".format(REFERENCE_OF.get(row['config'], 'reference'), size)
+    if prefix+'resp' not in references:
+        row['passed'] = None
+        return
+    row['respError'] = float(np.max(np.abs(entries['resp'].astype(np.float32) - references[prefix+'resp'])))
+    row['segError'] = int(np.max(np.abs(entries['seg'].astype(np.int64) - references[prefix+'seg'])))
+    row['aucError'] = float(abs(entries['auc'] - references[prefix+'auc']))
+    row['passed'] = bool(row['respError'] <= TOLERANCE['resp'] and row['segError'] <= TOLERANCE['seg'] and row['aucError'] <= TOLERANCE['auc'])
+
+# Compare the end-to-end times with those of a baseline results file
+def compareBaseline(rows, baseline, maxSlowdown):
+    previous = {(row['size'], row['config']): row for row in baseline['results']}
+    for row in rows:
+        before = previous.get((row['size'], row['config']))
+        if before is not None:
+            row['slowdown'] = row['endToEnd']/before['endToEnd']
+            row['fastEnough'] = bool(row['slowdown'] <= maxSlowdown)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark and check the B-COSFIRE pipeline on synthetic vessel images")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--configs', nargs='+', choices=list(CONFIGS), default=list(CONFIGS))
+    parser.add_argument('--repeat', type=int, default=1, help="number of timed end-to-end runs, the fastest is reported")
+    parser.add_argument('--output', help="JSON file to write the results to")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare the end-to-end times with")
+    parser.add_argument('--max-slowdown', type=float, default=1.25, help="largest allowed ratio to the baseline time")
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help="skip the traced run measuring peak memory")
+    parser.add_argument('--update-references', action='store_true', help="store the output of the reference configuration")
+    args = parser.parse_args(argv)
+
+    references = loadReferences()
+    configs = list(args.configs)
+    if args.update_references:
+        configs = [name for name in CONFIGS if name in configs or name in {'reference'} | set(REFERENCE_OF.values())]
+
+    rows = []
+    print("{:>6} {:>10} {:>8} {:>10} {:>10} {:>10} {:>10} {:>9} {:>9} {:>7} {:>7}".format(
+        'size', 'config', 'fit', 'responses', 'combine', 'total (s)', 'peak (MB)', 'resp err', 'seg err', 'AUC', 'check'))
+    for size in args.sizes:
+        rgb, truth = syntheticVessels(size)
+        for name in configs:
+            row, resp, segresp = benchmark(name, CONFIGS[name], rgb, args.repeat, args.memory)
+            row['size'] = size
+            entries = referenceEntries(resp, segresp, truth)
+            if args.update_references and REFERENCE_OF.get(name, 'reference') == name:
+                references.update({"{}/{}/{}".format(name, size, key): value for key, value in entries.items()})
+            check(row, size, entries, references)
+            rows.append(row)
+            print("{:>6} {:>10} {:>8.3f} {:>10.3f} {:>10.3f} {:>10.3f} {:>10} {:>9} {:>9} {:>7.4f} {:>7}".format(
+                size, name, row['fit'], row['computeResponses'], row['shiftCombine'], row['endToEnd'],
+                '-' if row['peakBytes'] is None else '{:.0f}'.format(row['peakBytes']/2**20),
+                '{:.3g}'.format(row['respError']) if 'respError' in row else '-',
+                '{:.3g}'.format(row['segError']) if 'segError' in row else '-',
+                row['auc'], {True: 'ok', False: 'FAILED', None: 'no ref'}[row['passed']]))
+    if args.update_references:
+        saveReferences(references)
+
+    failed = [row for row in rows if row['passed'] is False]
+    if args.baseline:
+        with open(args.baseline) as f:
+            compareBaseline(rows, json.load(f), args.max_slowdown)
+        for row in rows:
+            if 'slowdown' in row:
+                print("{:>6} {:>10} {:.2f}x the baseline time{}".format(row['size'], row['config'], row['slowdown'], '' if row['fastEnough'] else ', too slow'))
+        failed += [row for row in rows if row.get('fastEnough') is False]
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': rows}, f, indent=1)
+    if failed:
+        print("{} check(s) failed".format(len(failed)))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
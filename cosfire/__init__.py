@@ -1,7 +1,14 @@
 from .base import (FunctionFilter)
 from .filters import (GaussianFilter, DoGFilter, GaborFilter, CLAHE)
-from .functions import (circularPeaks, suppress, normalize, approx, rescaleImage, shiftImage, unique)
+from .functions import (circularPeaks, suppress, normalize, approx, rescaleImage, shiftImage, shiftBlocks, padImage, shiftWindow, tileGrid, applyToStack, unique)
 from .cosfire import (COSFIRE, CircleStrategy)
 from .utilities import (ImageStack, ImageStack, ImageObject)
+from .plan import (ShiftPlan)
+from .cache import (ResponseCache, SharedResponseCache)
+from .models import (saveModel, loadModel, modelKey, ModelRegistry, registry)
+from .sweep import (makeStrategy, configurations, sweepParameters, formatTable)
+from .profiling import (Profiler, NullProfiler, JsonLinesExporter, LogExporter)
+from .workspace import (Workspace, streamStats, recordFrame)
+from .store import (ResponseStore, StoredArray, StoreRecorder)
 
-__all__ = ['FunctionFilter', 'GaussianFilter', 'DoGFilter', 'GaborFilter', 'CLAHE', 'circularPeaks', 'normalize', 'approx', 'rescaleImage', 'suppress', 'shiftImage', 'unique', 'ImageStack']
+__all__ = ['FunctionFilter', 'GaussianFilter', 'DoGFilter', 'GaborFilter', 'CLAHE', 'circularPeaks', 'normalize', 'approx', 'rescaleImage', 'suppress', 'shiftImage', 'shiftBlocks', 'padImage', 'shiftWindow', 'tileGrid', 'applyToStack', 'unique', 'ImageStack', 'ShiftPlan', 'ResponseCache', 'SharedResponseCache', 'saveModel', 'loadModel', 'modelKey', 'ModelRegistry', 'registry', 'makeStrategy', 'configurations', 'sweepParameters', 'formatTable', 'Profiler', 'NullProfiler', 'JsonLinesExporter', 'LogExporter', 'Workspace', 'streamStats', 'recordFrame', 'ResponseStore', 'StoredArray', 'StoreRecorder']
@@ -13,17 +13,56 @@ You should have received a copy of the BSD General Public License along with
 this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
 """
 
-from sklearn.base import BaseEstimator, TransformerMixin
+from .estimator import BaseEstimator, TransformerMixin
+import numpy as np
+
+from .functions import applyToStack
+
+# Largest number of channels of an OpenCV image
+CV_CN_MAX = 512
 
 class FunctionFilter(BaseEstimator, TransformerMixin):
-    
+
+    # Whether the filter function filters every channel of a (height, width, channels) image separately,
+    # and the number of images of a stack filtered at once as the channels of one image
+    channels = True
+    chunkSize = 64
+
+    # Whether the filter function can write its result to the buffers passed to apply()
+    writesOut = False
+
+    # Subclasses store their constructor arguments under their own names, as scikit-learn's
+    # get_params and clone expect; the positional arguments of a plain FunctionFilter are not parameters
     def __init__(self, filter_function, *pargs, **kwargs):
         self.filter_function = filter_function
         self.pargs = pargs
         self.kwargs = kwargs
 
-    def fit(self):
+    # Nothing to fit; X and y are accepted as in scikit-learn pipelines
+    def fit(self, X=None, y=None):
         return self
 
+    def __sklearn_is_fitted__(self):
+        return True
+
+    # Filter an image, or every channel of a (height, width, channels) image
     def transform(self, image):
-        return self.filter_function(image, *self.pargs, **self.kwargs)
+        return self.apply(image)
+
+    # Filter every image of an (images, height, width) stack
+    def transformStack(self, images):
+        if not self.channels:
+            return np.stack([self.apply(img) for img in images])
+        return applyToStack(self.apply, images, min(self.chunkSize, CV_CN_MAX))
+
+    # Filter an image, or every channel of a (height, width, channels) image
+    # buffers are arrays to write to instead of allocating: out for the result, and scratch for a temporary
+    # result of some filters. If the filter function does not support them (writesOut), the result is copied to out.
+    def apply(self, image, **buffers):
+        if not buffers:
+            return self.filter_function(image, *self.pargs, **self.kwargs)
+        if self.writesOut:
+            return self.filter_function(image, *self.pargs, **self.kwargs, **buffers)
+        out = buffers['out']
+        np.copyto(out, self.filter_function(image, *self.pargs, **self.kwargs))
+        return out
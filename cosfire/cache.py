@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+"""
+This module provides the response cache of the circle strategy. Instead of computing every blurred filter response
+before combining, the responses are computed when they are first needed and dropped after their last use, so the
+number of responses alive at any time is bounded. An optional memory budget (in bytes) further limits the size of
+the cache: when a new response does not fit, responses that are still needed are evicted and recomputed later.
+
+The order in which the responses are used is known from the shift plan, so by default the cache evicts the response
+whose next use is farthest away (policy='plan'); policy='lru' evicts the least recently used response instead.
+
+A SharedResponseCache can be passed to any number of circle strategies (sharedCache) to share their filter and blurred
+responses: responses are keyed by a fingerprint of the subject, the filter and its arguments and the blur, so
+strategies transforming the same image reuse each other's intermediate responses within a size bound.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+from collections import Counter, OrderedDict
+import hashlib
+import math
+import threading
+
+import numpy as np
+
+# Fingerprint of the contents, shape and type of an image
+def fingerprint(image):
+    image = np.ascontiguousarray(image)
+    digest = hashlib.blake2b(image.data, digest_size=16)
+    digest.update(str((image.shape, image.dtype.str)).encode())
+    return digest.hexdigest()
+
+
+class ResponseCache():
+
+    def __init__(self, budget=None, policy='plan'):
+        if policy not in ('plan', 'lru'):
+            raise ValueError("Unknown cache policy '{}'".format(policy))
+        self.budget = budget
+        self.policy = policy
+        self.entries = OrderedDict()
+        self.uses = {}
+        self.used = Counter()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.released = 0
+        self.peakBytes = 0
+
+    # Declare the order in which the keys will be used
+    # A key is released after its last use, and its next use decides the eviction order
+    def plan(self, order):
+        self.uses = {}
+        for position, key in enumerate(order):
+            self.uses.setdefault(key, []).append(position)
+        self.used = Counter()
+
+    # Cached value of key, or the result of compute() if it is not cached
+    # Concurrent calls for the same missing key compute it only once
+    def get(self, key, compute):
+        while True:
+            with self.lock:
+                if key in self.entries:
+                    self.hits += 1
+                    self.entries.move_to_end(key)
+                    return self.entries[key]
+                event = self.pending.get(key)
+                if event is None:
+                    event = self.pending[key] = threading.Event()
+                    break
+            event.wait()
+        try:
+            value = compute()
+            self.put(key, value)
+        finally:
+            with self.lock:
+                del self.pending[key]
+            event.set()
+        return value
+
+    # Store a computed value; every computed value counts as a miss
+    def put(self, key, value):
+        with self.lock:
+            self.misses += 1
+            self._drop(key)
+            self._makeRoom(value.nbytes)
+            self.entries[key] = value
+            self.nbytes += value.nbytes
+            self.peakBytes = max(self.peakBytes, self.nbytes)
+
+    # Mark one use of key as done, dropping it after its last use
+    def release(self, key):
+        with self.lock:
+            self.used[key] += 1
+            if self.used[key] >= len(self.uses.get(key, ())) and key in self.entries:
+                self._drop(key)
+                self.released += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'released': self.released,
+            'peakBytes': self.peakBytes,
+            'budget': self.budget,
+        }
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Position of the next use of key, infinite if it is not used again
+    def _nextUse(self, key):
+        uses = self.uses.get(key, ())
+        return uses[self.used[key]] if self.used[key] < len(uses) else math.inf
+
+    def _makeRoom(self, nbytes):
+        while self.budget is not None and self.entries and self.nbytes + nbytes > self.budget:
+            if self.policy == 'lru':
+                victim = next(iter(self.entries))
+            else:
+                victim = max(self.entries, key=self._nextUse)
+            self._drop(victim)
+            self.evictions += 1
+
+    def _drop(self, key):
+        value = self.entries.pop(key, None)
+        if value is not None:
+            self.nbytes -= value.nbytes
+
+
+# Response cache shared between strategies, bounded to budget bytes
+# There is no plan across strategies, so the least recently used responses are evicted
+class SharedResponseCache(ResponseCache):
+
+    def __init__(self, budget=2**30):
+        super().__init__(budget, policy='lru')
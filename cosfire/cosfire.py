@@ -23,123 +23,805 @@ this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blo
 """
 
 
-from sklearn.base import BaseEstimator, TransformerMixin
+from .estimator import BaseEstimator, TransformerMixin
+import copy
 import math as m
+import cv2
 import numpy as np
+import os
+import threading
 import time
+from collections import Counter
+from functools import partial
 
 from .utilities import ImageStack
-from .functions import shiftImage,circularPeaks,unique
-from .filters import GaussianFilter
-
+from .functions import shiftImage,shiftRegion,shiftBlocks,circularPeaks,unique,padImage,shiftWindow,tileGrid,applyToStack
+from .filters import GaussianFilter, supportRadius, sigma2sz
+from .base import CV_CN_MAX
+from .plan import ShiftPlan
+from .cache import ResponseCache, fingerprint
+from .profiling import NULL_PROFILER
+from .parallel import threadPool, mapOrdered, effectiveJobs, limitThreads
+from .workspace import Workspace, streamStats, recordFrame
+
+# Smallest sigma of the Gaussian blurring one level of the blur cascade into the next: the variance
+# of smaller sampled Gaussians falls short of sigma^2, so the cascade would blur too little
+MIN_CASCADE_SIGMA = 1.0
+
+# Largest fraction of the image area the windows refined by transformPyramid may cover; above it,
+# transforming the whole image at once is cheaper than refining the windows one by one
+MAX_REFINED_AREA = 0.6
 
 class COSFIRE(BaseEstimator, TransformerMixin):
 
 	def __init__(self, strategy):
 		self.strategy = strategy
 
-	def fit(self, *pargs, **kwargs):
-		self.strategy.fit(*pargs, **kwargs)
+	def fit(self, X=None, y=None):
+		self.strategy.fit(X, y)
 		return self;
 
-	def transform(self, subject):
-		return self.strategy.transform(subject)
+	def __sklearn_is_fitted__(self):
+		return self.strategy.__sklearn_is_fitted__()
 
-	def get_params(self, deep=True):
-		return self.strategy.get_params(deep)
+	def transform(self, subject, mask=None):
+		return self.strategy.transform(subject, mask)
+
+	def transformStack(self, subjects):
+		return self.strategy.transformStack(subjects)
+
+	def transformTiled(self, subject, tileSize=1024, out=None):
+		return self.strategy.transformTiled(subject, tileSize, out)
+
+	def transformPoints(self, subject, coords, orientations=False):
+		return self.strategy.transformPoints(subject, coords, orientations)
+
+	def transformPyramid(self, subject, factor=0.5, threshold=0.1, margin=2, blockSize=64):
+		return self.strategy.transformPyramid(subject, factor, threshold, margin, blockSize)
 
+	def transformStream(self, frames):
+		return self.strategy.transformStream(frames)
+
+	def transformFrame(self, frame, workspace):
+		return self.strategy.transformFrame(frame, workspace)
+
+	# The strategy, and with deep=True also its parameters, by their own names and as strategy__<name>
+	def get_params(self, deep=True):
+		params = {'strategy': self.strategy}
+		if deep:
+			strategyParams = self.strategy.get_params(deep)
+			params.update(strategyParams)
+			params.update(('strategy__'+name, value) for (name, value) in strategyParams.items())
+		return params
+
+	# Set the strategy, or parameters of the strategy by their own names or as strategy__<name>
 	def set_params(self, **params):
-		return self.strategy.set_params(**params)
+		if 'strategy' in params:
+			self.strategy = params.pop('strategy')
+		self.strategy.set_params(**{name[len('strategy__'):] if name.startswith('strategy__') else name: value for (name, value) in params.items()})
+		return self
 
 
 class CircleStrategy(BaseEstimator, TransformerMixin):
 
-	def __init__(self, filt, filterArgs, rhoList, prototype, center, sigma0=0, alpha=0, rotationInvariance=[0], scaleInvariance=[1], T1=0, T2=0.2):
-		self.filterArgs = self.convertFilterArgs(filterArgs) if type(filterArgs) is dict else filterArgs
+	# Guards the shifted responses shared between variations evaluated in parallel
+	shiftLock = threading.Lock()
+
+	def __init__(self, filt, filterArgs, rhoList, prototype, center, sigma0=0, alpha=0, rotationInvariance=[0], scaleInvariance=[1], T1=0, T2=0.2, streaming=False, shiftMode='roll', n_jobs=1, executor=None, cvThreads=None, dtype=np.float64, combiner='product', cacheBudget=None, cachePolicy='plan', sharedCache=None, chunkSize=64, profiler=None, blurCascade=False, recorder=None):
+		self.filterArgs = filterArgs
 		self.filt = filt
 		self.T1 = T1
 		self.T2 = T2
 		self.rhoList = rhoList
 		self.prototype = prototype
 		self.center = center
-		self.sigma0 = sigma0/6
-		self.alpha = alpha/6
+		self.sigma0 = sigma0
+		self.alpha = alpha
 		self.rotationInvariance = rotationInvariance
 		self.scaleInvariance = scaleInvariance
-		self.timings = []
-
-	def fit(self):
-		self.protoStack = ImageStack().push(self.prototype).applyFilter(self.filt, self.filterArgs)
-		self.protoStack.threshold = self.T2
-		self.tuples = self.findTuples()
-
-	def transform(self, subject):
-		t0 = time.time()                                         # Time point
-
-		# Precompute all blurred filter responses
-		self.responses = self.computeResponses(subject)
-
-		# Store timing
-		self.timings.append( ("Precomputing {} filtered+blurred responses".format(len(self.responses)), time.time()-t0) )
-
-		t1 = time.time()                                         # Time point
-
+		self.streaming = streaming
+		self.shiftMode = shiftMode
+		self.n_jobs = n_jobs
+		self.executor = executor
+		self.cvThreads = cvThreads
+		self.dtype = dtype
+		self.combiner = combiner
+		self.cacheBudget = cacheBudget
+		self.cachePolicy = cachePolicy
+		self.sharedCache = sharedCache
+		self.chunkSize = chunkSize
+		self.profiler = profiler
+		self.blurCascade = blurCascade
+		self.recorder = recorder
+		self.recording = False
+
+	# Fit the tuples to the prototype; X and y are accepted as in scikit-learn pipelines, and ignored
+	def fit(self, X=None, y=None):
+		with self.profiling().span('fit'):
+			self.protoStack = ImageStack().push(self.prototype).applyFilter(self.filt, self.filterArgList())
+			self.protoStack.threshold = self.T2
+			self.tuples = self.findTuples()
+			self.plan = self.compilePlan()
+		return self
+
+	def __sklearn_is_fitted__(self):
+		return hasattr(self, 'tuples')
+
+	# Filter arguments applied to the prototype, converted from named arguments if given as a dict
+	def filterArgList(self):
+		return self.convertFilterArgs(self.filterArgs) if type(self.filterArgs) is dict else self.filterArgs
+
+	# The profiler of the strategy, or one that records nothing (see cosfire.profiling)
+	def profiling(self):
+		return self.profiler if self.profiler is not None else NULL_PROFILER
+
+	# Transform an image, or every channel of a (height, width, channels) image
+	def transform(self, subject, mask=None):
+		if mask is not None:
+			return self.transformMasked(subject, mask)
+		return self.transformChannels(subject, record=self.recorder is not None and np.ndim(subject) == 2)
+
+	# Transform every image of an (images, height, width) stack
+	# The images are processed chunkSize at a time, as the channels of one image,
+	# so every filter, blur and shift step handles a whole chunk at once
+	def transformStack(self, subjects):
+		return applyToStack(self.transformChannels, subjects, min(self.chunkSize, CV_CN_MAX))
+
+	# Transform an image, or every channel of a (height, width, channels) image
+	# With record, the intermediate responses are passed to the recorder (see _transform)
+	def transformChannels(self, subject, record=False):
+		with threadPool(self.n_jobs, self.executor) as pool, limitThreads(self.cvThreadLimit()):
+			return self._transform(subject, pool, record=record)
+
+	# Transform only where the mask is non-zero, the result is 0 elsewhere
+	# The subject is cropped to the bounding box of the mask plus the halo, and the shifting
+	# and combining is further restricted to the mask pixels of every band of bandHeight rows.
+	# In roll mode, axes along which the halo crosses the image border are not cropped, to keep the wrap-around.
+	def transformMasked(self, subject, mask, bandHeight=64):
+		with self.profiling().span('masked', shape=np.shape(subject)):
+			t0 = time.time()                                         # Time point
+			mask = np.asarray(mask) != 0
+			if mask.all():
+				return self.transform(subject)
+
+			height, width = subject.shape[:2]
+			result = np.zeros((height, width), dtype=self.dtype)
+			rows = np.flatnonzero(mask.any(axis=1))
+			cols = np.flatnonzero(mask.any(axis=0))
+			if len(rows) == 0:
+				return result
+
+			# Crop to the bounding box plus halo; the crop starts at a multiple of 64 columns, see transformTiled
+			halo = self.halo()
+			(y0, y1) = (max(0, rows[0]-halo), min(height, rows[-1]+1+halo))
+			(x0, x1) = (max(0, cols[0]-halo)//64*64, min(width, cols[-1]+1+halo))
+			if self.shiftMode == 'roll':
+				if rows[0] < halo or rows[-1]+1+halo > height:
+					(y0, y1) = (0, height)
+				if cols[0] < halo or cols[-1]+1+halo > width:
+					(x0, x1) = (0, width)
+			window = (slice(y0, y1), slice(x0, x1))
+			cropMask = mask[window]
+
+			# Bands of rows, restricted to the runs of columns that contain mask pixels
+			# A band is split where more than bandHeight columns in a row contain no mask pixels
+			regions = []
+			for top in range(rows[0]-y0, rows[-1]+1-y0, bandHeight):
+				band = slice(top, min(top+bandHeight, y1-y0))
+				bandCols = np.flatnonzero(cropMask[band].any(axis=0))
+				if len(bandCols) > 0:
+					for run in np.split(bandCols, np.flatnonzero(np.diff(bandCols) > bandHeight)+1):
+						regions.append( (band, slice(run[0], run[-1]+1)) )
+
+			with threadPool(self.n_jobs, self.executor) as pool, limitThreads(self.cvThreadLimit()):
+				result[window] = self._transform(subject[window], pool, regions)
+			result[~mask] = 0
+
+			# Store the fraction of the image that was filtered and combined
+			combined = sum((r.stop-r.start)*(c.stop-c.start) for (r, c) in regions)
+			self.maskStats = {'filtered': float((y1-y0)*(x1-x0)/(height*width)), 'combined': float(combined/(height*width)), 'seconds': time.time()-t0}
+
+			return result
+
+	# Transform the subject in tiles of at most tileSize x tileSize pixels and stitch the results
+	# Every tile is extended by the halo, so that it is computed exactly as by transform(subject).
+	# This requires shiftMode='window': the wrap-around at the border of roll mode is not reproduced.
+	# subject and out can be np.memmap arrays, only one extended tile is loaded at a time
+	def transformTiled(self, subject, tileSize=1024, out=None):
+		if self.shiftMode != 'window':
+			raise ValueError("transformTiled requires shiftMode='window', not '{}'".format(self.shiftMode))
+		if out is None:
+			out = np.empty(subject.shape[:2], dtype=self.dtype)
+		halo = self.halo()
+		# OpenCV vectorizes along the rows, so the extended tiles start at a multiple of 64 columns
+		# to have the same columns rounded the same way as in the full image
+		for (tile, window, core) in tileGrid(subject.shape, tileSize, halo, align=64):
+			out[tile] = self.transformChannels(subject[window])[core]
+		return out
+
+	# Coarse-to-fine transform: the strategy is first applied to the subject downsampled by factor (see scaled).
+	# Where the coarse response exceeds threshold times its maximum, dilated by margin coarse pixels, the subject
+	# is transformed at full resolution in the boxes of refineBoxes(), every box exactly as by transform(subject);
+	# elsewhere the upsampled coarse response is used. If the windows of the boxes cover more than
+	# MAX_REFINED_AREA of the image, the whole image is transformed instead, after the coarse pass.
+	# This only pays off on sparse images, of which the responding structures cover a small part (e.g. a lesion or
+	# a crop of interest); a full fundus image falls back and takes longer than transform(subject).
+	# This requires shiftMode='window': in roll mode, the halo of the boxes along the border wraps around the
+	# whole image, and every image responds along its zero-padded border, so it would always fall back.
+	def transformPyramid(self, subject, factor=0.5, threshold=0.1, margin=2, blockSize=64):
+		if self.shiftMode != 'window':
+			raise ValueError("transformPyramid requires shiftMode='window', not '{}'".format(self.shiftMode))
+		with self.profiling().span('pyramid', shape=np.shape(subject), factor=factor):
+			t0 = time.time()                                         # Time point
+			subject = np.asarray(subject, dtype=self.dtype)
+			(height, width) = subject.shape[:2]
+			coarseSize = (max(1, int(round(width*factor))), max(1, int(round(height*factor))))
+			coarse = self.scaled(factor).transform(cv2.resize(subject, coarseSize, interpolation=cv2.INTER_AREA))
+
+			# Regions to refine at full resolution
+			refine = (coarse > threshold*coarse.max()).astype(np.uint8)
+			if margin > 0:
+				refine = cv2.dilate(refine, np.ones((2*margin+1, 2*margin+1), np.uint8))
+			refine = cv2.resize(refine, (width, height), interpolation=cv2.INTER_NEAREST) > 0
+			t1 = time.time()                                         # Time point
+
+			boxes = self.refineBoxes(refine, blockSize)
+			filtered = sum((window[0].stop-window[0].start)*(window[1].stop-window[1].start) for (box, window, core) in boxes)
+			fallback = filtered > MAX_REFINED_AREA*height*width
+			if fallback:
+				result = self.transformChannels(subject)
+				(refined, filtered) = (height*width, height*width)
+			else:
+				result = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_LINEAR)
+				covered = np.zeros((height, width), dtype=bool)
+				for (box, window, core) in boxes:
+					result[box] = self.transformChannels(subject[window])[core]
+					covered[box] = True
+				refined = np.count_nonzero(covered)
+
+			# Store the fractions of the image that were refined and filtered at full resolution
+			self.pyramidStats = {'refined': float(refined/(height*width)), 'filtered': float(filtered/(height*width)),
+								 'fallback': bool(fallback), 'coarseSeconds': t1-t0, 'seconds': time.time()-t0}
+
+			return result
+
+	# Boxes covering the mask, as (box, window, core) slices (see tileGrid). The image is divided into blocks of
+	# blockSize x blockSize pixels; every run of adjacent blocks containing mask pixels in a row of blocks is a box,
+	# merged with the boxes of the same columns in the rows below, so that e.g. a strip along the image border is
+	# a single box. Every box is extended by the halo to a window of which the core is computed exactly as by
+	# transform() in window mode. The windows start at a multiple of 64 columns (see transformTiled).
+	def refineBoxes(self, mask, blockSize=64):
+		(height, width) = mask.shape[:2]
+		(rows, cols) = (-(-height//blockSize), -(-width//blockSize))
+		blocks = np.zeros((rows*blockSize, cols*blockSize), dtype=bool)
+		blocks[:height, :width] = mask
+		blocks = blocks.reshape(rows, blockSize, cols, blockSize).any(axis=(1, 3))
+
+		# Runs of blocks as (first row, end row, first column, end column), in blocks
+		runs = []
+		active = {}
+		for row in range(rows+1):
+			current = {}
+			if row < rows:
+				columns = np.flatnonzero(blocks[row])
+				for run in np.split(columns, np.flatnonzero(np.diff(columns) > 1)+1) if len(columns) else []:
+					span = (int(run[0]), int(run[-1])+1)
+					current[span] = active.pop(span, row)
+			runs += [(start, row) + span for (span, start) in active.items()]
+			active = current
+
+		halo = self.halo()
+		boxes = []
+		for (by0, by1, bx0, bx1) in sorted(runs):
+			(y0, y1) = (by0*blockSize, min(height, by1*blockSize))
+			(x0, x1) = (bx0*blockSize, min(width, bx1*blockSize))
+			(wy0, wy1) = (max(0, y0-halo), min(height, y1+halo))
+			(wx0, wx1) = (max(0, x0-halo)//64*64, min(width, x1+halo))
+			boxes.append( ((slice(y0, y1), slice(x0, x1)),
+						   (slice(wy0, wy1), slice(wx0, wx1)),
+						   (slice(y0-wy0, y1-wy0), slice(x0-wx0, x1-wx0))) )
+		return boxes
+
+	# Copy of the fitted strategy for a subject rescaled by factor: rho is scaled through scaleInvariance,
+	# the blurring through sigma0 (and alpha, as it multiplies the scaled rho), and the filters through
+	# their sigma, which is taken to be their first argument as for DoGFilter
+	def scaled(self, factor):
+		strategy = copy.copy(self)
+		strategy.scaleInvariance = [upsilon*factor for upsilon in self.scaleInvariance]
+		strategy.sigma0 = self.sigma0*factor
+		strategy.tuples = [(rho, phi, args[0]*factor) + tuple(args[1:]) for (rho, phi, *args) in self.tuples]
+		strategy.plan = None
+		strategy.recorder = None
+		return strategy
+
+	# Response at the given points only, as (x, y) pairs: equal to transform(subject) at these points
+	# Only the part of the subject around the points is filtered and blurred, and only the shifted values at
+	# the points are combined. Points are grouped in blocks of blockSize x blockSize pixels, of which the
+	# surroundings are filtered in one piece when that is cheaper than filtering around every point.
+	# Returns: array with a response per point, and with orientations=True also an array (points, variations)
+	# with the combined response of every variation (psi, upsilon) of the plan
+	def transformPoints(self, subject, coords, orientations=False, blockSize=128):
+		with self.profiling().span('points', points=len(coords)):
+			self.plan = self.compilePlan()
+			self.checkOptions()
+			subject = np.asarray(subject, dtype=self.dtype)
+			coords = np.asarray(coords, dtype=np.intp).reshape(-1, 2)
+			(height, width) = subject.shape[:2]
+			if np.any(coords < 0) or np.any(coords[:,0] >= width) or np.any(coords[:,1] >= height):
+				raise ValueError("Points outside the subject of shape {}".format(subject.shape))
+
+			# Distinct offsets (dx, dy) read from the blurred response of every (args, sigma) job
+			responseJobs = {key: (key[1:], sigma) for key, sigma in self.blurSigmas().items()}
+			self.blurPlan = self.blurPlans()
+			offsets = {}
+			for (key, dx, dy) in self.plan.uses:
+				offsets.setdefault(responseJobs[key], {}).setdefault((dx, dy), len(offsets.get(responseJobs[key], ())))
+			reach = self.plan.maxShift()
+			halo = self.halo() - reach
+
+			# Values of the blurred responses at the offsets of every point: job -> (points, offsets)
+			values = {job: np.zeros((len(coords), len(steps)), dtype=self.dtype) for job, steps in offsets.items()}
+			blocks = {}
+			for i, (x, y) in enumerate(coords):
+				blocks.setdefault((y//blockSize, x//blockSize), []).append(i)
+			pointCost = (2*(reach+halo)+1)**2
+			for indices in blocks.values():
+				indices = np.array(indices)
+				(xs, ys) = (coords[indices,0], coords[indices,1])
+				blockCost = (np.ptp(xs)+2*(reach+halo)+1)*(np.ptp(ys)+2*(reach+halo)+1)
+				for group in ([indices] if blockCost < len(indices)*pointCost else indices[:,None]):
+					(xs, ys) = (coords[group,0], coords[group,1])
+					(y0, x0) = (ys.min()-reach, xs.min()-reach)
+					region = self.blurredRegion(subject, (y0, ys.max()+reach+1), (x0, xs.max()+reach+1), offsets, halo)
+					for job, steps in offsets.items():
+						(dx, dy) = np.array(list(steps)).T
+						values[job][group] = region[job][ys[:,None]+dy-y0, xs[:,None]+dx-x0]
+
+			# Clip (and take the logarithm of) the values as prepareResponse does
+			for job in values:
+				np.clip(values[job], 0, None, out=values[job])
+				if self.combiner != 'product':
+					with np.errstate(divide='ignore'):
+						np.log(values[job], out=values[job])
+
+			# Combine the values of every variation in the same order as shiftCombine
+			combine = np.multiply if self.combiner == 'product' else np.add
+			result = np.zeros((len(coords), len(self.plan.variations)), dtype=self.dtype)
+			for v, variation in enumerate(self.plan.variations):
+				steps = self.plan.steps[variation]
+				weights = self.combineWeights(steps)
+				total = float(sum(weights)) if weights is not None else len(steps)
+				combined = None
+				for i, (key, dx, dy) in enumerate(steps):
+					job = responseJobs[key]
+					value = values[job][:, offsets[job][(dx, dy)]]
+					if weights is not None:
+						value = value*weights[i]
+					combined = value.copy() if combined is None else combine(combined, value, out=combined)
+				if self.combiner == 'product':
+					result[:,v] = np.power(combined, 1/total)
+				else:
+					result[:,v] = np.exp(combined/total)
+
+			responses = np.amax(result, axis=1) if len(self.plan.variations) else np.zeros(len(coords), dtype=self.dtype)
+			return (responses, result) if orientations else responses
+
+	# Blurred responses of the given jobs over the rows and columns [start, stop), which may extend beyond the
+	# subject: wrapped around in roll mode, zero in window mode as the shifts of transform() do
+	# The subject is filtered in pieces extended by the halo, starting at a multiple of 64 columns (see transformTiled)
+	# Returns: dict job -> response over the region
+	def blurredRegion(self, subject, rows, cols, jobs, halo):
+		(height, width) = subject.shape[:2]
+		region = {job: np.zeros((rows[1]-rows[0], cols[1]-cols[0]), dtype=self.dtype) for job in jobs}
+
+		# Pieces [start, stop) of the region inside one period of the subject (only the subject itself in window mode)
+		def pieces(start, stop, size):
+			periods = range(start//size, (stop-1)//size+1) if self.shiftMode == 'roll' else [0]
+			for k in periods:
+				(a, b) = (max(start, k*size), min(stop, (k+1)*size))
+				if a < b:
+					yield (a-k*size, b-k*size, a-start)
+
+		for (iy0, iy1, ry) in pieces(rows[0], rows[1], height):
+			for (ix0, ix1, rx) in pieces(cols[0], cols[1], width):
+				wy0 = max(0, iy0-halo)
+				wx0 = max(0, ix0-halo)//64*64
+				window = subject[wy0:min(height, iy1+halo), wx0:min(width, ix1+halo)]
+				crop = (slice(iy0-wy0, iy1-wy0), slice(ix0-wx0, ix1-wx0))
+				filtered = {}
+				blurred = {}
+				# By increasing sigma, so the levels of the blur cascade are blurred before they are needed
+				for (args, sigma) in sorted(jobs):
+					if args not in filtered:
+						filtered[args] = self.filterResponse(window, args)
+					blurred[(args, sigma)] = self.blurLevel(filtered[args], args, sigma, lambda base: blurred[(args, base)])
+					region[(args, sigma)][ry:ry+iy1-iy0, rx:rx+ix1-ix0] = blurred[(args, sigma)][crop]
+		return region
+
+	# Transform a stream of frames of the same shape (e.g. the frames of a video), yielding the response of every frame
+	# All intermediate responses are written to the arrays of a Workspace allocated for the first frame, so the later
+	# frames are transformed without allocating. The yielded response is an array of the workspace as well, which the
+	# next frame overwrites: copy it to keep it. A frame of another shape starts a new workspace.
+	# The frames are transformed on the calling thread. streamStats holds the number of frames, the seconds spent on the
+	# first frame (which allocates the workspace) and on the later ones, the sustained frames per second over the later
+	# frames, and the bytes of the workspace.
+	def transformStream(self, frames):
+		stats = self.streamStats = streamStats()
+		workspace = None
+		for frame in frames:
+			t0 = time.perf_counter()
+			if workspace is None or not workspace.matches(np.shape(frame)):
+				workspace = Workspace(np.shape(frame), self.dtype)
+			response = self.transformFrame(frame, workspace)
+			recordFrame(stats, time.perf_counter() - t0, workspace)
+			yield response
+
+	# Transform one frame of a stream (see transformStream), equal to transform(frame)
+	# Returns: the response, an array of the workspace
+	def transformFrame(self, frame, workspace):
+		with self.profiling().span('frame', shape=workspace.shape):
+			variations = workspace.get('plan', lambda: self.streamPlan(workspace.shape))
+			subject = workspace.array('subject')
+			np.copyto(subject, frame, casting='unsafe')
+			paddedShape = (workspace.shape[0]+2*self.pad, workspace.shape[1]+2*self.pad) + workspace.shape[2:]
+
+			# Filter and blur every distinct (args, sigma) once, and prepare the blurred
+			# responses once all the levels of the blur cascade have been blurred
+			prepared = workspace.get('prepared', dict)
+			for args, blurs in self.blurPlan.items():
+				filtered = self.filterResponse(subject, args, workspace)
+				for sigma in sorted(blurs):
+					(base, increment, path) = blurs[sigma]
+					source = filtered if base is None else prepared[(args, base)]
+					prepared[(args, sigma)] = self.blurResponse(source, increment, workspace, workspace.array(('blurred', args, sigma)))
+				for sigma in blurs:
+					out = workspace.array(('padded', args, sigma), paddedShape) if self.shiftMode == 'window' else prepared[(args, sigma)]
+					prepared[(args, sigma)] = self.prepareResponse(prepared[(args, sigma)], out)
+
+			# Combine the shifted responses of every variation block by block, and fold the results into the maximum
+			combine = np.multiply if self.combiner == 'product' else np.add
+			combined = workspace.array('combined')
+			scratch = workspace.array('scratch')
+			result = workspace.array('result')
+			for i, (steps, total) in enumerate(variations):
+				with self.profiling().span('combine'):
+					for j, (job, blocks, weight) in enumerate(steps):
+						response = prepared[job]
+						for (target, source) in blocks:
+							shifted = response[source]
+							if weight is not None:
+								shifted = np.multiply(shifted, weight, out=scratch[target])
+							if j == 0:
+								np.copyto(combined[target], shifted)
+							else:
+								combine(combined[target], shifted, out=combined[target])
+					if self.combiner == 'product':
+						np.power(combined, 1/total, out=combined)
+					else:
+						np.exp(np.divide(combined, total, out=combined), out=combined)
+				with self.profiling().span('max'):
+					if i == 0:
+						np.copyto(result, combined)
+					else:
+						np.maximum(result, combined, out=result)
+			return result
+
+	# Plan of the stream mode for frames of the given shape, made once per workspace: for every variation its steps,
+	# as the (args, sigma) of the response they read, the (target, source) blocks of shifting it and the weight of
+	# the weighted geometric mean (None if unweighted), and the total weight
+	def streamPlan(self, shape):
+		self.plan = self.compilePlan()
+		self.checkOptions()
+		self.pad = self.plan.maxShift()
+		self.responseJobs = {key: (key[1:], sigma) for key, sigma in self.blurSigmas().items()}
+		self.blurPlan = self.blurPlans()
+		(height, width) = shape[:2]
 		variations = []
-		for psi in self.rotationInvariance:
-			for upsilon in self.scaleInvariance:
-				variations.append( (psi, upsilon) )
-
-		# Store the maximum of all the orientations
-		result = np.amax([self.shiftCombine(tupl) for tupl in variations], axis=0)
-
-		# Store timing
-		self.timings.append( ("Shifting and combining all responses", time.time()-t1) )
-
-		return result
-
-	def shiftCombine( self, variation ):
+		for variation in self.plan.variations:
+			steps = self.plan.steps[variation]
+			weights = self.combineWeights(steps)
+			total = float(sum(weights)) if weights is not None else len(steps)
+			entries = []
+			for i, (key, dx, dy) in enumerate(steps):
+				if self.shiftMode == 'window':
+					# The window of the padded response read by shiftWindow
+					blocks = [((slice(0, height), slice(0, width)), (slice(self.pad+dy, self.pad+dy+height), slice(self.pad+dx, self.pad+dx+width)))]
+				else:
+					blocks = shiftBlocks(shape, -dx, -dy)
+				entries.append( (self.responseJobs[key], blocks, weights[i] if weights is not None else None) )
+			variations.append( (entries, total) )
+		return variations
+
+	# Transform the subject, shifting and combining only inside the given regions (slices) if any
+	# With record, recorder(strategy, kind, key, response) receives the filter response of every filter
+	# argument (kind 'filtered', key args) and the combined response of every variation (kind 'orientation',
+	# key (psi, upsilon)) of the subject; only whole images are recorded, not regions, tiles or points
+	def _transform(self, subject, pool, regions=None, record=False):
+		with self.profiling().span('transform', shape=np.shape(subject), regions=len(regions) if regions is not None else None):
+			# The tuples may have been changed after fitting
+			self.plan = self.compilePlan()
+			self.checkOptions()
+
+			subject = np.asarray(subject, dtype=self.dtype)
+			self.pad = self.plan.maxShift()
+
+			# The blurred responses are computed when first needed and released after their last use,
+			# within the memory budget of the cache if given. Without a budget, all of them are computed up front.
+			self.cache = ResponseCache(self.cacheBudget, self.cachePolicy)
+			self.subject = subject
+			self.recording = record and regions is None and self.recorder is not None
+			self.recordedArgs = set()
+			self.fingerprint = fingerprint(subject) if self.sharedCache is not None else None
+			self.responseJobs = {key: (key[1:], sigma) for key, sigma in self.blurSigmas().items()}
+			self.blurPlan = self.blurPlans()
+			self.cache.plan(self.cacheOrder(regions))
+			if self.cacheBudget is None:
+				for key, response in self.computeResponses(subject, pool).items():
+					job = ('blurred',)+self.responseJobs[key]
+					if job not in self.cache:
+						self.cache.put(job, self.prepareResponse(response))
+
+			# Shifted responses shared between variations, and the number of uses left for every step of the plan
+			self.shifted = {}
+			self.remainingUses = Counter(self.plan.uses)
+
+			if regions is None:
+				result = self.combineVariations(pool)
+			else:
+				result = np.zeros(subject.shape, dtype=self.dtype)
+				for region in regions:
+					result[region] = self.combineVariations(pool, region)
+
+			# Release the remaining responses, only the counters of the cache are kept
+			self.cache.clear()
+			self.subject = None
+			self.recording = False
+			for (name, value) in self.cache.stats().items():
+				if name not in ('peakBytes', 'budget'):
+					self.profiling().count('cache.'+name, value)
+
+			return result
+
+	def checkOptions(self):
+		if self.shiftMode not in ('roll', 'window'):
+			raise ValueError("Unknown shift mode '{}'".format(self.shiftMode))
+		if self.combiner not in ('product', 'log', 'weighted'):
+			raise ValueError("Unknown combiner '{}'".format(self.combiner))
+		if self.cachePolicy not in ('plan', 'lru'):
+			raise ValueError("Unknown cache policy '{}'".format(self.cachePolicy))
+
+	# Maximum of the shifted and combined responses of all the orientations, inside region if given
+	def combineVariations(self, pool, region=None):
+		shiftCombine = lambda variation: self.shiftCombine(variation, region)
+		if self.streaming:
+			# Fold every orientation into a running maximum, so only one result
+			# (plus a few per worker thread) is kept alive
+			result = None
+			for variation, curResult in zip(self.plan.variations, mapOrdered(shiftCombine, self.plan.variations, pool, window=2*effectiveJobs(self.n_jobs))):
+				if self.recording:
+					self.recorder(self, 'orientation', variation, curResult)
+				if result is None:
+					result = curResult
+				else:
+					with self.profiling().span('max'):
+						np.maximum(result, curResult, out=result)
+			return result
+		results = list(mapOrdered(shiftCombine, self.plan.variations, pool, window=len(self.plan.variations)))
+		if self.recording:
+			for variation, curResult in zip(self.plan.variations, results):
+				self.recorder(self, 'orientation', variation, curResult)
+		with self.profiling().span('max'):
+			return np.amax(results, axis=0)
+
+	def shiftCombine( self, variation, region=None ):
 		psi = variation[0]
 		upsilon = variation[1]
-		t0 = time.time()                                 # Time point
-
-		# Adjust base tuples
-		curTuples = [(rho*upsilon, phi+psi, *params) for (rho, phi, *params) in self.tuples]
 
-		# Collect shifted filter responses
-		curResponses = []
-		for tupl in curTuples:
-			rho = tupl[0]
-			phi = tupl[1]
-			args = tupl[2:]
-			dx = int(round(rho*np.cos(phi)))
-			dy = int(round(-rho*np.sin(phi)))
-
-			# Apply shift
-			response = shiftImage(self.responses[(rho,)+args], -dx, -dy).clip(min=0)
-
-			# Add to set of responses
-			#curResponses.append( (response, rho) )    # For weighted geometric mean
-			curResponses.append( response )
-
-		# Combine shifted filter responses
-		# curResult = self.weightedGeometricMean(curResponses)
-		result = np.multiply.reduce(curResponses)
-		result = result**(1/len(curResponses))
-
-		# Store timing
-		self.timings.append( ("\tShifting and combining the responses for psi={:4.2f} and upsilon={}".format(psi, upsilon), time.time()-t0) )
-
-		return result
+		with self.profiling().span('combine', psi=float(psi), upsilon=float(upsilon)):
+			# Adjusted base tuples, as (response key, dx, dy) steps of the plan
+			steps = self.plan.steps[(psi, upsilon)]
+
+			# The geometric mean is either computed as the n-th root of the product of the responses,
+			# or in the log domain as exp(mean(log)) of the (weighted) log-responses, which does not underflow
+			combine = np.multiply if self.combiner == 'product' else np.add
+			weights = self.combineWeights(steps)
+			total = float(sum(weights)) if weights is not None else len(steps)
+
+			# Collect shifted filter responses, or combine them into a single accumulator when streaming
+			curResponses = []
+			result = None
+			owned = False
+			scratch = None
+			for i, (key, dx, dy) in enumerate(steps):
+				# Apply shift
+				response = self.shiftedResponse(key, dx, dy, region)
+
+				# Apply the weight of the weighted geometric mean
+				if weights is not None:
+					if not self.streaming:
+						response = response*weights[i]
+					else:
+						scratch = response*weights[i] if scratch is None else np.multiply(response, weights[i], out=scratch)
+						response = scratch
+
+				# Add to set of responses
+				if not self.streaming:
+					curResponses.append( response )
+				elif result is None:
+					result = response.copy() if response is scratch else response
+					owned = response is scratch
+				elif not owned:
+					# The shifted responses may be views or shared, so only write to a new accumulator
+					result = combine(result, response)
+					owned = True
+				else:
+					combine(result, response, out=result)
+
+			if not self.streaming:
+				result = combine.reduce(curResponses)
+				owned = True
+
+			# Combine shifted filter responses
+			out = result if owned else None
+			if self.combiner == 'product':
+				result = np.power(result, 1/total, out=out)
+			else:
+				result = np.exp(np.divide(result, total, out=out), out=out)
+
+			return result
+
+	# Prepare a blurred response for shifting and combining:
+	#  - window mode: pad it with zeros, so all shifts can be read as views
+	#  - log combiners: take the logarithm once, so shifted log-responses only have to be added
+	# Negative values are clipped here, or after shifting in roll mode with the product combiner
+	# With out (the padded response in window mode, otherwise the response itself) the result is written to out, and
+	# also clipped with the product combiner, as the stream mode reads the shifted blocks straight from the response
+	def prepareResponse(self, response, out=None):
+		if self.shiftMode == 'window':
+			if out is None:
+				response = padImage(response, self.pad)
+			else:
+				np.copyto(shiftWindow(out, self.pad, 0, 0), response)
+				response = out
+			np.clip(response, 0, None, out=response)
+		elif self.combiner != 'product' or out is not None:
+			response = np.clip(response, 0, None, out=out)
+		if self.combiner != 'product':
+			with np.errstate(divide='ignore'):
+				np.log(response, out=response)
+		return response
+
+	# Weights of the weighted geometric mean for the steps of a variation, a Gaussian
+	# function of the distance rho of the tuples to the support center (None if unweighted)
+	def combineWeights(self, steps):
+		if self.combiner != 'weighted':
+			return None
+		rhos = np.array([key[0] for (key, dx, dy) in steps], dtype=np.float64)
+		maxWeight = 2*(np.amax(rhos)/3)**2
+		weights = np.exp(-(rhos**2)/maxWeight) if maxWeight > 0 else np.ones(len(rhos))
+		return [float(weight) for weight in weights]
+
+	# Shifted (and clipped) response for a step of the plan, or only the given region of it
+	# In roll mode, shifts used again by a later variation are kept until their last use
+	def shiftedResponse(self, key, dx, dy, region=None):
+		with self.profiling().span('shift'):
+			(args, sigma) = self.responseJobs[key]
+			if self.shiftMode == 'window':
+				response = shiftWindow(self.blurredResponse(args, sigma), self.pad, -dx, -dy)
+				self.releaseResponse(args, sigma)
+				return response if region is None else response[region]
+
+			# Only a region is combined: shift just the region instead of sharing the whole shifted response
+			if region is not None:
+				response = shiftRegion(self.blurredResponse(args, sigma), -dx, -dy, region)
+				self.releaseResponse(args, sigma)
+				if self.combiner == 'product':
+					response = response.clip(min=0)
+				return response
+
+			step = (key, dx, dy)
+			response = self.shifted.get(step)
+			if response is None:
+				response = shiftImage(self.blurredResponse(args, sigma), -dx, -dy)
+				self.releaseResponse(args, sigma)
+				if self.combiner == 'product':
+					response = response.clip(min=0)
+				self.profiling().allocated(response.nbytes)
+			with self.shiftLock:
+				self.remainingUses[step] -= 1
+				if self.remainingUses[step] > 0:
+					response = self.shifted.setdefault(step, response)
+				else:
+					self.shifted.pop(step, None)
+			return response
+
+	# Blurred response (prepared for shifting, see prepareResponse) of the filter with
+	# the given arguments, through the response cache of the current transform
+	# The levels of the blur cascade are kept in the cache as well, without a planned use they are evicted first
+	def blurredResponse(self, args, sigma):
+		def compute():
+			filtered = self.cache.get(('filtered', args), lambda: self.sharedFilterResponse(self.subject, args))
+			blurred = self.sharedBlurResponse(filtered, args, sigma, partial(self.cachedLevel, filtered, args))
+			return self.prepareResponse(blurred)
+		return self.cache.get(('blurred', args, sigma), compute)
+
+	# Mark a use of the blurred response, and of the filter response it is blurred from, as done
+	def releaseResponse(self, args, sigma):
+		self.cache.release(('blurred', args, sigma))
+		self.cache.release(('filtered', args))
+
+	# Level base of the blur cascade of the filter response filtered, through the response cache
+	# The lookup of the lower levels is a new partial, not a closure over itself: such a reference cycle
+	# would keep the filter response alive until the garbage collector runs
+	def cachedLevel(self, filtered, args, base):
+		return self.cache.get(('level', args, base), lambda: self.sharedBlurResponse(filtered, args, base, partial(self.cachedLevel, filtered, args)))
+
+	# Filter response of the subject (see filterResponse), reused from sharedCache if any
+	# strategy sharing it computed the same filter with the same T1 on the same subject
+	# While recording, the response is passed to the recorder, once per transform even if it is computed again
+	def sharedFilterResponse(self, subject, args):
+		response = self.sharedResponse(('filtered', self.filt, args, self.T1), lambda: self.filterResponse(subject, args))
+		if self.recording and args not in self.recordedArgs:
+			self.recordedArgs.add(args)
+			self.recorder(self, 'filtered', args, response)
+		return response
+
+	# Blurred filter response (see blurLevel), reused from sharedCache if any strategy sharing
+	# it applied the same blurs to the same filter response of the same subject
+	def sharedBlurResponse(self, filtered, args, sigma, level):
+		key = ('blurred', self.filt, args, self.T1, self.blurPlan[args][sigma][2])
+		return self.sharedResponse(key, lambda: self.blurLevel(filtered, args, sigma, level))
+
+	# Response for the key from sharedCache, computed and stored as read-only if missing
+	def sharedResponse(self, key, compute):
+		if self.sharedCache is None:
+			return compute()
+		def computeShared():
+			response = compute()
+			response.setflags(write=False)
+			return response
+		return self.sharedCache.get((self.fingerprint,)+key, computeShared)
+
+	# Order in which shiftCombine uses the cached responses: the blurred response of every step
+	# (in roll mode without regions only the first use of a step, later uses share the shifted response),
+	# once for every region if given, each preceded by the filter response it is blurred from: the filter response is
+	# kept until the last use of its blurred responses, as any of them evicted meanwhile is blurred from it again
+	def cacheOrder(self, regions=None):
+		order = []
+		steps = self.plan.order(shared=self.shiftMode == 'roll' and regions is None)
+		for (key, dx, dy) in steps*(len(regions) if regions is not None else 1):
+			job = self.responseJobs[key]
+			order += [('filtered', job[0]), ('blurred',)+job]
+		return order
+
+	# Number of OpenCV threads while transforming: cvThreads if given, otherwise
+	# the CPUs are divided over the worker threads when running in parallel
+	def cvThreadLimit(self):
+		if self.cvThreads is not None:
+			return self.cvThreads
+		jobs = effectiveJobs(self.n_jobs)
+		return max(1, (os.cpu_count() or 1)//jobs) if jobs > 1 else None
+
+	# Compile the shift plan for the current tuples, or reuse the
+	# compiled one if the tuples and invariances did not change
+	def compilePlan(self):
+		plan = getattr(self, 'plan', None)
+		if plan is None or not plan.matches(self.tuples, self.rotationInvariance, self.scaleInvariance):
+			plan = ShiftPlan(self.tuples, self.rotationInvariance, self.scaleInvariance)
+		return plan
+
+	# Largest shift (in pixels) applied to any response over all variations
+	def maxShift(self):
+		return self.compilePlan().maxShift()
 
 	def findTuples(self):
 		# Init some variables
 		(cx, cy) = self.center
 		tuples = []
 
-		t0 = time.time()                                     # Time point
+		phis = np.arange(360)/360*2*np.pi
 		# Go over every rho (radius of circles)
 		for rho in self.rhoList:
-			t1 = time.time()                                 # Time point
 			if rho == 0:
 				# Circle with no radius, so just the center point
 				val = self.protoStack.valueAtPoint(cx, cy)
@@ -147,87 +829,161 @@ class CircleStrategy(BaseEstimator, TransformerMixin):
 					tuples.append((rho, 0)+val[1])
 			elif rho > 0:
 				# Compute points on the circle of radius rho with center point (cx,cy)
-				coords = [ ( cx+int(round(rho*np.cos(phi))) , cy+int(round(rho*np.sin(phi))) )
-							for phi in
-								[i/360*2*np.pi for i in range(360)]
-						 ]
-				# Make list unique
-				coords = [coords[i] for i in sorted(set([coords.index(c) for c in coords]))]
+				xs = cx + np.round(rho*np.cos(phis)).astype(int)
+				ys = cy + np.round(rho*np.sin(phis)).astype(int)
+				# Make points unique, keeping the order along the circle
+				first = np.sort(np.unique(np.stack([xs, ys], axis=1), axis=0, return_index=True)[1])
+				xs, ys = xs[first], ys[first]
 
 				# Retrieve values on the circle points in the given filtered prototype
-				vals = [self.protoStack.valueAtPoint(*coord)+coord for coord in coords]
+				vals, layers = self.protoStack.valuesAtPoints(xs, ys)
 
 				# Find peaks in circle
-				maxima = circularPeaks([x[0] for x in vals])
+				maxima = circularPeaks(vals)
 				for i in maxima:
-					dx = vals[i][2] - cx
-					dy = vals[i][3] - cy
-					phi = (np.arctan2(dy, dx))%(2*np.pi)
-					tuples.append( (rho,phi)+vals[i][1] )
-
-			# Store timing
-			self.timings.append( ("\tFinding tuples for rho={}".format(rho), time.time()-t1) )
-
-		# Store timing
-		self.timings.append( ("Finding all {} tuples for {} different values of rho".format(len(tuples), len(self.rhoList)), time.time()-t0) )
+					phi = (np.arctan2(ys[i] - cy, xs[i] - cx))%(2*np.pi)
+					tuples.append( (rho,phi)+self.protoStack.params[layers[i]] )
 
 		return tuples
 
-	def computeResponses(self, subject):
+	def computeResponses(self, subject, pool=None):
 		# Response steps:
 		#  - apply the filter
 		#  - trim off values < T1
 		#  - apply blurring
-
-		t0 = time.time()                                 # Time point
+		# The filters and blurs are distributed over the given thread pool, if any
 
 		uniqueArgs = unique([ tuple(args) for (rho,phi,*args) in self.tuples])
-		filteredResponses = {}
-		for args in uniqueArgs:
-			# First apply the chosen filter
-			filteredResponse = self.filt(*args).transform(subject)
-			# ReLU
-			filteredResponse = np.where(filteredResponse < self.T1, 0, filteredResponse)
-			# Save response
-			filteredResponses[args] = filteredResponse
+		filteredResponses = dict(zip(uniqueArgs, mapOrdered(lambda args: self.sharedFilterResponse(subject, args), uniqueArgs, pool, len(uniqueArgs))))
+
+		# Blur every distinct (args, sigma) once
+		sigmas = self.blurSigmas()
+		self.blurPlan = self.blurPlans()
+		blurredResponses = {}
+		if self.blurCascade:
+			# The levels of a cascade are blurred one after the other, by increasing sigma
+			def blurCascade(args):
+				levels = {}
+				for sigma in sorted(self.blurPlan[args]):
+					levels[sigma] = self.sharedBlurResponse(filteredResponses[args], args, sigma, levels.__getitem__)
+				return levels
+			for args, levels in zip(self.blurPlan, mapOrdered(blurCascade, list(self.blurPlan), pool, len(self.blurPlan))):
+				blurredResponses.update({(args, sigma): response for sigma, response in levels.items()})
+		else:
+			def blur(job):
+				args, sigma = job
+				return self.sharedBlurResponse(filteredResponses[args], args, sigma, None)
+
+			jobs = unique([(key[1:], sigma) for key, sigma in sigmas.items()])
+			blurredResponses = dict(zip(jobs, mapOrdered(blur, jobs, pool, len(jobs))))
+		responses = {key: blurredResponses[(key[1:], sigma)] for key, sigma in sigmas.items()}
 
-		# Store timing
-		self.timings.append( ("\tApplying {} filter(s)".format(len(filteredResponses)), time.time()-t0) )
-		t1 = time.time()                                 # Time point
+		return responses
 
-		responses = {}
+	# Blurring sigma for every response key (rho*upsilon, *args): (sigma0 + rho*alpha)/6
+	def blurSigmas(self):
+		(sigma0, alpha) = (self.sigma0/6, self.alpha/6)
+		sigmas = {}
 		for tupl in self.tuples:
 			rho = tupl[0]
 			args = tupl[2:]
-
-			if self.alpha != 0:
-				for upsilon in self.scaleInvariance:
-					localRho = rho * upsilon
-					localSigma = self.sigma0 + localRho*self.alpha
-					blurredResponse = GaussianFilter(localSigma, sz=int(round(localSigma*6))+(1-int(round(localSigma*6))%2)).transform(filteredResponses[args])
-					responses[(localRho,)+args] = blurredResponse
-			else:
-				blurredResponse = GaussianFilter(self.sigma0).transform(filteredResponses[args])
-				for upsilon in self.scaleInvariance:
-					localRho = rho * upsilon
-					responses[(localRho,)+args] = blurredResponse
-
-		# Store timing
-		self.timings.append( ("\tComputing {} blurred filter response(s)".format(len(responses)), time.time()-t1) )
-
-		return responses
+			for upsilon in self.scaleInvariance:
+				localRho = rho * upsilon
+				sigmas[(localRho,)+args] = sigma0 + localRho*alpha if alpha != 0 else sigma0
+		return sigmas
+
+	# Blurring of the filter response of every filter argument: dict args -> {sigma: (base, increment, path)}
+	# for the blurring sigmas of blurSigmas(). Without blurCascade, every response is blurred directly (base None,
+	# increment sigma). With blurCascade, as the variances of Gaussians add, the response for sigma is blurred from
+	# the response for the largest smaller sigma base with an increment of sqrt(sigma^2 - base^2), if that is at least
+	# MIN_CASCADE_SIGMA and its kernel is smaller than the direct one. path lists the (sigma, kernel size) of the
+	# blurs from the filter response, which identifies the result.
+	# Of the filters of BCOSFIRE(), only the largest blur of the symmetrical one is cascaded (sigma 1.433 from 0.967,
+	# an increment of 1.058); every increment of the asymmetrical one is below MIN_CASCADE_SIGMA, so it is all direct.
+	# benchmarks/cascade.py checks both cases.
+	def blurPlans(self):
+		plans = {}
+		for key, sigma in self.blurSigmas().items():
+			plans.setdefault(key[1:], {})[sigma] = None
+		for plan in plans.values():
+			done = []
+			for sigma in sorted(plan):
+				(base, increment) = (None, sigma)
+				if self.blurCascade:
+					for candidate in reversed(done):
+						step = m.sqrt(sigma**2 - candidate**2)
+						if step >= MIN_CASCADE_SIGMA:
+							if self.blurSize(step) < self.blurSize(sigma):
+								(base, increment) = (candidate, step)
+							break
+				path = (plan[base][2] if base is not None else ()) + ((increment, self.blurSize(increment)),)
+				plan[sigma] = (base, increment, path)
+				done.append(sigma)
+		return plans
+
+	# Blurred filter response for sigma following blurPlan: blurred directly,
+	# or from the blurred response level(base) of the cascade
+	def blurLevel(self, filtered, args, sigma, level):
+		(base, increment, path) = self.blurPlan[args][sigma]
+		return self.blurResponse(filtered if base is None else level(base), increment)
+
+	def blurFilter(self, sigma):
+		return GaussianFilter(sigma, sz=self.blurSize(sigma))
+
+	# Filter response blurred with the blur for sigma
+	# With a workspace, the blur is kept in the workspace and the response written to out
+	def blurResponse(self, filtered, sigma, workspace=None, out=None):
+		with self.profiling().span('blur', sigma=float(sigma)):
+			if workspace is not None:
+				return workspace.get(('blur', sigma), lambda: self.blurFilter(sigma)).apply(filtered, out=out)
+			response = self.blurFilter(sigma).apply(filtered)
+			self.profiling().allocated(response.nbytes)
+			return response
+
+	# Size of the blurring kernel: odd and 6*sigma wide if alpha != 0, otherwise the default size
+	def blurSize(self, sigma):
+		if self.alpha != 0:
+			return int(round(sigma*6))+(1-int(round(sigma*6))%2)
+		return sigma2sz(sigma)
+
+	# Width (in pixels) of the border around a region that influences its response: the support of
+	# the filters, plus that of the widest blur (or cascade of blurs), plus the largest shift
+	def halo(self):
+		plan = self.compilePlan()
+		filterRadius = max([supportRadius(self.filt(*args)) for args in unique([key[1:] for key in plan.keys()])], default=0)
+		blurRadius = max([sum(size//2 for (sigma, size) in path) for blurs in self.blurPlans().values() for (base, increment, path) in blurs.values()], default=0)
+		return filterRadius + blurRadius + plan.maxShift()
+
+	# Filter response for the given filter arguments, with values < T1 set to 0
+	def filterResponse(self, subject, args, workspace=None):
+		with self.profiling().span('filter', args=args):
+			if workspace is not None:
+				# Filter and apply the ReLU in the arrays of the workspace
+				filt = workspace.get(('filter', args), lambda: self.filt(*args))
+				response = filt.apply(subject, out=workspace.array(('filtered', args)), scratch=workspace.array('scratch'))
+				below = workspace.array('below', dtype=bool)
+				np.less(response, self.T1, out=below)
+				np.copyto(response, 0, where=below)
+				return response
+			# First apply the chosen filter
+			filteredResponse = self.filt(*args).apply(subject)
+			# ReLU
+			response = np.where(filteredResponse < self.T1, 0, filteredResponse)
+			self.profiling().allocated(filteredResponse.nbytes + response.nbytes)
+			return response
 
 	# Function to compute the weighted geometric mean
-	# of a list of responses
+	# of a list of (response, rho) pairs, in the log domain
 	def weightedGeometricMean(self, images):
 	    maxWeight = 2*(np.amax([img[1] for img in images])/3)**2
 	    totalWeight = 0
-	    result = np.ones(images[0][0].shape)
-	    for img in images:
-	        weight = np.exp(-(img[1]**2)/maxWeight)
-	        totalWeight += weight
-	        result = np.multiply(result, img[0]**weight)
-	    return result**(1/totalWeight)
+	    result = np.zeros(images[0][0].shape)
+	    with np.errstate(divide='ignore'):
+	        for img in images:
+	            weight = np.exp(-(img[1]**2)/maxWeight)
+	            totalWeight += weight
+	            result += weight*np.log(img[0])
+	    return np.exp(result/totalWeight)
 
 	def convertFilterArgs(self, dict):
 		if len(dict) == 2:
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""
+This module provides the base classes of the filters, in place of those of scikit-learn. Importing scikit-learn takes
+over a second, which dominates the start-up of short-lived jobs, while the filters only use its estimator interface.
+BaseEstimator and TransformerMixin implement that interface (get_params, set_params and fit_transform) the way
+scikit-learn does, so the filters still work with sklearn.base.clone, pipelines and parameter searches when
+scikit-learn is installed, without cosfire importing it or depending on it.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+
+class BaseEstimator():
+
+    # Names of the parameters: the named arguments of the constructor
+    @classmethod
+    def _get_param_names(cls):
+        import inspect
+        if cls.__init__ is object.__init__:
+            return []
+        parameters = inspect.signature(cls.__init__).parameters.values()
+        return sorted(p.name for p in parameters if p.name != 'self' and p.kind not in (p.VAR_POSITIONAL, p.VAR_KEYWORD))
+
+    # The parameters, read from the attributes of the same name
+    # With deep=True, also the parameters of parameters that are estimators, as '<parameter>__<name>'
+    def get_params(self, deep=True):
+        params = {}
+        for name in self._get_param_names():
+            value = getattr(self, name, None)
+            if deep and hasattr(value, 'get_params') and not isinstance(value, type):
+                params.update((name + '__' + key, item) for key, item in value.get_params().items())
+            params[name] = value
+        return params
+
+    # Set parameters by name, or those of a parameter that is an estimator as '<parameter>__<name>'
+    def set_params(self, **params):
+        if not params:
+            return self
+        valid = self.get_params(deep=True)
+        nested = {}
+        for key, value in params.items():
+            (name, delimiter, subKey) = key.partition('__')
+            if name not in valid:
+                raise ValueError("Invalid parameter '{}' for {}, valid parameters are: {}".format(name, type(self).__name__, self._get_param_names()))
+            if delimiter:
+                nested.setdefault(name, {})[subKey] = value
+            else:
+                setattr(self, name, value)
+                valid[name] = value
+        for name, subParams in nested.items():
+            valid[name].set_params(**subParams)
+        return self
+
+    # Tags of the estimator for scikit-learn >= 1.6, which is already imported when it asks for them
+    def __sklearn_tags__(self):
+        from sklearn.utils import Tags, TargetTags, TransformerTags
+        return Tags(estimator_type=None, target_tags=TargetTags(required=False),
+                    transformer_tags=TransformerTags() if isinstance(self, TransformerMixin) else None)
+
+
+class TransformerMixin():
+
+    def fit_transform(self, X, y=None, **fit_params):
+        if y is None:
+            return self.fit(X, **fit_params).transform(X)
+        return self.fit(X, y, **fit_params).transform(X)
@@ -22,31 +22,43 @@ You should have received a copy of the BSD General Public License along with
 this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
 """
 
-from sklearn.base import BaseEstimator, TransformerMixin
 import cv2
-import scipy.signal as signal
 from .base import FunctionFilter
 import numpy as np
 
 class GaussianFilter(FunctionFilter):
     def __init__(self, sigma, sz=0):
+        self.sigma = sigma
+        self.sz = sz
         sz = sigma2sz(sigma) if sz <= 0 else sz
         kernel = cv2.getGaussianKernel(sz, sigma)
         super().__init__(_sepFilter2D, kernel)
 
+    writesOut = True
+
 class DoGFilter(FunctionFilter):
-    def __init__(self, sigma, onoff, sigmaRatio=0.5):
+    def __init__(self, sigma, onoff, sigmaRatio=0.5, backend='auto'):
+        self.sigma = sigma
+        self.onoff = onoff
+        self.sigmaRatio = sigmaRatio
+        self.backend = backend
         sz = sigma2sz(sigma)
-        kernel1 = np.outer(cv2.getGaussianKernel(sz, sigma),cv2.getGaussianKernel(sz, sigma))
-        kernel2 = np.outer(cv2.getGaussianKernel(sz, sigma*sigmaRatio),cv2.getGaussianKernel(sz, sigma*sigmaRatio))
+        kernel1 = cv2.getGaussianKernel(sz, sigma)
+        kernel2 = cv2.getGaussianKernel(sz, sigma*sigmaRatio)
         if (onoff):
-            kernel = kernel2 - kernel1
+            super().__init__(_DoGFilter2D, kernel2, kernel1, backend)
         else:
-            kernel = kernel1 - kernel2
-        super().__init__(_Filter2D, kernel)
+            super().__init__(_DoGFilter2D, kernel1, kernel2, backend)
+
+    writesOut = True
 
 class GaborFilter(FunctionFilter):
     def __init__(self, sigma, theta, lambd, gamma, psi):
+        self.sigma = sigma
+        self.theta = theta
+        self.lambd = lambd
+        self.gamma = gamma
+        self.psi = psi
         sz = sigma2sz(sigma)
         kernel = cv2.getGaborKernel((sz, sz), sigma, theta, lambd, gamma, psi);
         super().__init__(_Filter2D, kernel);
@@ -56,18 +68,68 @@ class CLAHE(FunctionFilter):
         clahe = cv2.createCLAHE(tileGridSize=(8, 8), clipLimit=0.01, distribution='uniform', alpha=0.4)
         super().__init__(_CLAHE, clahe)
 
+    # CLAHE only takes single-channel images
+    channels = False
+
 # Executes a 2D convolution by using a 1D kernel twice
-def _sepFilter2D(image, kernel):
-    return cv2.sepFilter2D(image, -1, kernel, kernel)
+def _sepFilter2D(image, kernel, out=None, scratch=None):
+    return cv2.sepFilter2D(image, -1, kernel, kernel, dst=out)
 
 # Executes a 2D convolution by using a 2D kernel
 def _Filter2D(image, kernel):
+    from scipy import signal
+    kernel = np.reshape(kernel, np.shape(kernel) + (1,)*(np.ndim(image)-2))
     result = signal.convolve(image, kernel, mode='same')
     return result
 
+# Executes a Difference-of-Gaussians as the difference of two separable
+# Gaussian convolutions, with zero padding like signal.convolve(mode='same')
+#  - 'dense': signal.convolve with the dense 2D DoG kernel (the reference path)
+#  - 'separable': two cv2.sepFilter2D passes
+#  - 'fft': signal.fftconvolve with the dense 2D DoG kernel
+#  - 'auto': picks 'separable' or 'fft' from the kernel and image size
+# The separable and FFT outputs match the dense path within DOG_TOLERANCE
+# (absolute, for images with values in [0,1])
+# The channels of a (height, width, channels) image are filtered separately
+# The separable passes are written to out and scratch if given, the other backends copy their result to out
+def _DoGFilter2D(image, positive, negative, backend='auto', out=None, scratch=None):
+    if backend == 'auto':
+        backend = dogBackend(len(positive), image.shape[:2])
+    if backend == 'separable':
+        ddepth = cv2.CV_32F if image.dtype == np.float32 else cv2.CV_64F
+        result = cv2.sepFilter2D(image, ddepth, positive, positive, dst=out, borderType=cv2.BORDER_CONSTANT)
+        result -= cv2.sepFilter2D(image, ddepth, negative, negative, dst=scratch, borderType=cv2.BORDER_CONSTANT)
+        return result
+    if out is not None:
+        np.copyto(out, _DoGFilter2D(image, positive, negative, backend))
+        return out
+    # SciPy takes over a second to import, so it is only imported by the backends using it
+    from scipy import signal
+    kernel = np.outer(positive, positive) - np.outer(negative, negative)
+    if image.dtype == np.float32:
+        kernel = kernel.astype(np.float32)
+    kernel = kernel.reshape(kernel.shape + (1,)*(image.ndim-2))
+    if backend == 'fft':
+        return signal.fftconvolve(image, kernel, mode='same', axes=(0, 1))
+    if backend == 'dense':
+        return signal.convolve(image, kernel, mode='same')
+    raise ValueError("Unknown DoG backend '{}'".format(backend))
+
+# Choose the DoG backend: the separable passes cost ~4*sz operations per pixel,
+# the FFT ~log2(#pixels), so the FFT only pays off for large kernels
+def dogBackend(sz, shape):
+    return 'fft' if sz > FFT_KERNEL_FACTOR*np.log2(max(np.prod(shape), 2)) else 'separable'
+
+FFT_KERNEL_FACTOR = 2.2
+DOG_TOLERANCE = 1e-12
+
 # Executes Contrast Limited Adaptive Histogram Equalization
 def _CLAHE(image, clahe):
     return clahe.apply(image)
 
+# Radius (in pixels) of the support of a kernel-based filter: half the size of its largest kernel
+def supportRadius(filt):
+    return max([max(np.shape(kernel))//2 for kernel in filt.pargs if isinstance(kernel, np.ndarray)], default=0)
+
 def sigma2sz(sigma):
     return int(np.ceil(sigma*3))*2 + 1; # Guaranteed to be odd
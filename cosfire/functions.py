@@ -13,74 +13,169 @@ You should have received a copy of the BSD General Public License along with
 this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
 """
 
-from sklearn.base import BaseEstimator, TransformerMixin
 import numpy as np
 
 # Function to find maxima in a circular array
+# A maximum is either a value larger than both neighbours, or the middle of a plateau
+# (values within d of each other) that is bounded by smaller values on both sides
 # Returns: array of indices
 def circularPeaks(array):
+    array = np.asarray(array, dtype=np.float64)
     n = len(array)
     d = 0.00005    # Small error correction
-    maxima = []
-    for i, val in enumerate(array):
-        if (array[(i-1)%n]+d < val and array[(i+1)%n]+d < val):
-            maxima.append(i)
-        elif (abs(array[(i-1)%n] - val) < d and abs(array[(i+1)%n] - val) < d):
-            l = r = 0
-            k = 1
-            while (abs(array[(i-k)%n] - val) < d) and k < n:
-                l += 1; k += 1
-            if (array[(i-k)%n] > val+d):
-                l = 0
-            if k == n:
-                return maxima
-            k = 1
-            while (abs(array[(i+k)%n] - val) < d) and k < n:
-                r += 1; k += 1
-            if (array[(i+k)%n] > val+d):
-                r = 0
-            if k == n:
-                return maxima
-            if (l > 0 and r > 0 and (l == r or l + 1 == r)):
-                maxima.append(i)
-    return maxima
+    left = np.roll(array, 1)
+    right = np.roll(array, -1)
+    maxima = (left+d < array) & (right+d < array)
+
+    # Plateaus: both neighbours are within d of the value
+    plateau = np.flatnonzero((np.abs(left-array) < d) & (np.abs(right-array) < d))
+    if plateau.size:
+        offsets = np.arange(1, n)
+        val = array[plateau, None]
+        # Values at increasing distance to the left and right of every plateau point
+        leftVals = array[(plateau[:,None]-offsets)%n]
+        rightVals = array[(plateau[:,None]+offsets)%n]
+        leftClose = np.abs(leftVals-val) < d
+        rightClose = np.abs(rightVals-val) < d
+
+        # If the whole array is within d of a plateau value, there are no further maxima
+        flat = leftClose.all(axis=1)
+        if flat.any():
+            end = plateau[np.argmax(flat)]
+            maxima[end:] = False
+            keep = plateau < end
+            plateau, val = plateau[keep], val[keep]
+            leftVals, rightVals, leftClose, rightClose = leftVals[keep], rightVals[keep], leftClose[keep], rightClose[keep]
+
+    if plateau.size:
+        # Length of the plateau to the left and right, 0 if it rises after the plateau
+        rows = np.arange(len(plateau))
+        l = np.argmin(leftClose, axis=1)
+        r = np.argmin(rightClose, axis=1)
+        l = np.where(leftVals[rows, l] > val[:,0]+d, 0, l)
+        r = np.where(rightVals[rows, r] > val[:,0]+d, 0, r)
+        middle = (l > 0) & (r > 0) & ((l == r) | (l+1 == r))
+        maxima[plateau[middle]] = True
+    return np.flatnonzero(maxima).tolist()
 
 # Set all values < factor*max to 0
 def suppress(image, factor):
-    maxVal = image.max()
-    supImage = np.zeros(shape=image.shape)
-    for (x,y), value in np.ndenumerate(image):
-        supImage[x,y] = 0 if value < factor*maxVal else value;
-    return supImage
+    image = np.asarray(image)
+    return np.where(image < factor*image.max(), 0, image).astype(np.float64)
 
-def normalize(image):
+# With out, the result is written to out instead of a new array
+def normalize(image, out=None):
     mn = image.min()
     mx = image.max()
     if (mn == mx):
         if (mn == 0):
+            if out is not None:
+                np.copyto(out, image)
+                return out
             return image
         else:
-            return image/mn
+            return np.divide(image, mn, out=out)
     else:
         image -= mn
-        return image/(mx-mn)
+        return np.divide(image, mx-mn, out=out)
 
 def approx(float):
     return round(float, 3)
 
-def rescaleImage(image, mn, mx):
-    image = normalize(image)*(mx-mn)
+def rescaleImage(image, mn, mx, out=None):
+    image = np.multiply(normalize(image, out), mx-mn, out=out)
     image += mn
     return image
 
-def shiftImage(image, dx, dy):
+# Shift an image by dx columns and dy rows, wrapping around the border
+# With out (an array of the same shape), the result is written to it without allocating
+def shiftImage(image, dx, dy, out=None):
+    if out is not None:
+        for (target, source) in shiftBlocks(image.shape, dx, dy):
+            np.copyto(out[target], image[source])
+        return out
     shift = np.roll(image, dx, axis=1)
     shift = np.roll(shift, dy, axis=0)
     return shift
 
+# Blocks of shiftImage(image, dx, dy) that do not wrap around the border
+# Returns: list of (target, source) pairs of slices, out[target] = image[source] for every pair
+def shiftBlocks(shape, dx, dy):
+    (height, width) = shape[:2]
+    (dx, dy) = (dx % width, dy % height)
+    rows = [(slice(dy, height), slice(0, height-dy)), (slice(0, dy), slice(height-dy, height))]
+    cols = [(slice(dx, width), slice(0, width-dx)), (slice(0, dx), slice(width-dx, width))]
+    return [((targetRows, targetCols), (sourceRows, sourceCols)) for (targetRows, sourceRows) in rows for (targetCols, sourceCols) in cols
+            if targetRows.stop > targetRows.start and targetCols.stop > targetCols.start]
+
+# The region (a pair of slices) of shiftImage(image, dx, dy), without shifting the whole image
+# Returns a view of image if the region does not wrap around the border, and a copy otherwise
+def shiftRegion(image, dx, dy, region):
+    (rows, cols) = region
+    (height, width) = image.shape[:2]
+    top = (rows.start - dy) % height
+    left = (cols.start - dx) % width
+    (rowCount, colCount) = (rows.stop - rows.start, cols.stop - cols.start)
+    if top + rowCount <= height and left + colCount <= width:
+        return image[top:top+rowCount, left:left+colCount]
+    rows = (top + np.arange(rowCount)) % height
+    cols = (left + np.arange(colCount)) % width
+    return image[np.ix_(rows, cols)]
+
+# Apply func, which takes a (height, width, channels) image, to every image of an (images, height, width)
+# stack, passing chunks of at most chunkSize images as the channels of one image
+def applyToStack(func, stack, chunkSize):
+    out = None
+    for start in range(0, len(stack), chunkSize):
+        chunk = np.ascontiguousarray(np.moveaxis(stack[start:start+chunkSize], 0, -1))
+        # OpenCV drops the channel axis of single-channel results
+        result = np.moveaxis(func(chunk).reshape(chunk.shape[:2] + (-1,)), -1, 0)
+        if out is None:
+            out = np.empty((len(stack),) + result.shape[1:], dtype=result.dtype)
+        out[start:start+len(result)] = result
+    return out if out is not None else np.zeros(np.shape(stack))
+
+# Pad an image with zeros, so that shifts of up to pad pixels
+# can be read from it with shiftWindow
+def padImage(image, pad):
+    return np.pad(image, [(pad, pad), (pad, pad)] + [(0, 0)]*(np.ndim(image)-2))
+
+# Shift a padded image (see padImage) by reading an offset window of it
+# Unlike shiftImage, this returns a view (no allocation) and shifts in
+# zeros at the border instead of wrapping the image around
+def shiftWindow(padded, pad, dx, dy):
+    height = padded.shape[0] - 2*pad
+    width = padded.shape[1] - 2*pad
+    return padded[pad-dy:pad-dy+height, pad-dx:pad-dx+width]
+
+# Split an image of the given shape into tiles of at most tileSize x tileSize pixels,
+# each extended by a halo of the given width (clipped to the image border), with the
+# left edge of the extended tile moved left to a multiple of align
+# Yields: (tile, window, core) slices of the tile in the image, of the extended
+# tile in the image, and of the tile in the extended tile
+def tileGrid(shape, tileSize, halo, align=1):
+    height, width = shape[:2]
+    for y0 in range(0, height, tileSize):
+        for x0 in range(0, width, tileSize):
+            y1 = min(y0+tileSize, height)
+            x1 = min(x0+tileSize, width)
+            wy0 = max(0, y0-halo)
+            wx0 = max(0, x0-halo)//align*align
+            wy1 = min(height, y1+halo)
+            wx1 = min(width, x1+halo)
+            yield ( (slice(y0, y1), slice(x0, x1)),
+                    (slice(wy0, wy1), slice(wx0, wx1)),
+                    (slice(y0-wy0, y1-wy0), slice(x0-wx0, x1-wx0)) )
+
+# Items of the list without duplicates, in the order of their first occurrence
 def unique(list):
-    unique_list = []
-    for x in list:
-        if x not in unique_list:
-            unique_list.append(x)
-    return unique_list
+    values = [*list]
+    try:
+        return [*dict.fromkeys(values)]
+    except TypeError:
+        # Unhashable items, such as lists, are compared one by one
+        unique_list = []
+        for x in values:
+            if x not in unique_list:
+                unique_list.append(x)
+        return unique_list
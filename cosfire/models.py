@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+"""
+This module provides persistence for fitted circle strategies, so that the configuration step of the B-COSFIRE algorithm
+(filtering the prototype, sampling the circles and finding the peaks) only has to be executed once per configuration.
+
+A fitted model is stored as a compressed .npz file holding the prototype and a small JSON header with the strategy
+parameters, its runtime options (dtype, shift mode, combiner, ...) and the tuples found by CircleStrategy.findTuples.
+The ModelRegistry keeps the fitted tuples in memory, keyed by the strategy parameters, and can optionally persist
+them in a directory.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import hashlib
+import importlib
+import json
+import os
+import threading
+import numpy as np
+
+from .cosfire import COSFIRE, CircleStrategy
+
+FORMAT_VERSION = 1
+
+# Runtime options of a CircleStrategy saved with a model; the executor, caches, profiler
+# and recorder belong to the running process and are not saved
+OPTIONS = ('streaming', 'shiftMode', 'n_jobs', 'cvThreads', 'dtype', 'combiner', 'cacheBudget', 'cachePolicy', 'chunkSize', 'blurCascade')
+
+# Save a fitted COSFIRE model or CircleStrategy to a compressed .npz file
+def saveModel(model, path):
+    strategy = _strategy(model)
+    if not hasattr(strategy, 'tuples'):
+        raise ValueError("Only fitted models can be saved, call fit() first")
+    options = {name: _plain(getattr(strategy, name)) for name in OPTIONS}
+    options['dtype'] = np.dtype(strategy.dtype).name
+    header = dict(_parameters(strategy), version=FORMAT_VERSION, tuples=_plain(strategy.tuples), options=options)
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, header=np.array(json.dumps(header)), prototype=np.asarray(strategy.prototype))
+    return path
+
+# Load a fitted model saved by saveModel, with the runtime options it was saved with
+# options (e.g. dtype or shiftMode, or sharedCache and profiler) are passed to CircleStrategy, replacing the saved ones
+# Returns: COSFIRE object wrapping the fitted CircleStrategy
+def loadModel(path, **options):
+    with np.load(path) as data:
+        header = json.loads(str(data['header']))
+        prototype = data['prototype']
+    if header['version'] != FORMAT_VERSION:
+        raise ValueError("Unsupported model format version {}".format(header['version']))
+
+    saved = dict(header['options'], dtype=np.dtype(header['options']['dtype']).type)
+    strategy = CircleStrategy(
+        _resolve(header['filt']), tuple(header['filterArgs']), header['rhoList'], prototype, tuple(header['center']),
+        sigma0=header['sigma0'], alpha=header['alpha'],
+        rotationInvariance=np.array(header['rotationInvariance']), scaleInvariance=header['scaleInvariance'],
+        T1=header['T1'], T2=header['T2'], **dict(saved, **options))
+    strategy.tuples = [tuple(tupl) for tupl in header['tuples']]
+    return COSFIRE(strategy)
+
+# Key identifying the fitted state of a strategy: every parameter
+# used by fit(), plus the rotation and scale sets used by transform()
+def modelKey(model):
+    return json.dumps(_parameters(_strategy(model)), sort_keys=True)
+
+
+# In-process store of fitted tuples keyed by the strategy parameters,
+# so a long-running worker fits each configuration only once
+class ModelRegistry():
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.models = {}
+        self.lock = threading.Lock()
+
+    # Fit the given COSFIRE model or CircleStrategy, reusing the tuples
+    # of an earlier fit with the same parameters when available
+    def fit(self, model):
+        strategy = _strategy(model)
+        key = modelKey(strategy)
+        with self.lock:
+            tuples = self.models.get(key)
+            if tuples is None:
+                tuples = self._fitOrLoad(strategy, key)
+                self.models[key] = tuples
+        strategy.tuples = list(tuples)
+        return model
+
+    def clear(self):
+        with self.lock:
+            self.models.clear()
+
+    def __contains__(self, model):
+        return modelKey(model) in self.models
+
+    def __len__(self):
+        return len(self.models)
+
+    def _fitOrLoad(self, strategy, key):
+        path = None
+        if self.directory is not None:
+            path = os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.npz')
+            if os.path.exists(path):
+                return loadModel(path).strategy.tuples
+        strategy.fit()
+        if path is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            saveModel(strategy, path)
+        return strategy.tuples
+
+# Default registry used by BCOSFIRE()
+registry = ModelRegistry()
+
+
+def _strategy(model):
+    return model.strategy if isinstance(model, COSFIRE) else model
+
+def _parameters(strategy):
+    prototype = np.ascontiguousarray(strategy.prototype)
+    return {
+        'filt': strategy.filt.__module__ + ':' + strategy.filt.__qualname__,
+        'filterArgs': _plain(strategy.filterArgList()),
+        'rhoList': _plain(strategy.rhoList),
+        'prototype': hashlib.sha1(prototype.tobytes() + str((prototype.shape, prototype.dtype.str)).encode()).hexdigest(),
+        'center': _plain(strategy.center),
+        'sigma0': _plain(strategy.sigma0),
+        'alpha': _plain(strategy.alpha),
+        'rotationInvariance': _plain(strategy.rotationInvariance),
+        'scaleInvariance': _plain(strategy.scaleInvariance),
+        'T1': _plain(strategy.T1),
+        'T2': _plain(strategy.T2),
+    }
+
+# Convert (nested) numpy values, ranges and tuples to JSON-compatible values
+def _plain(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple, range)):
+        return [_plain(v) for v in value]
+    return value
+
+def _resolve(name):
+    module, qualname = name.split(':')
+    obj = importlib.import_module(module)
+    for attr in qualname.split('.'):
+        obj = getattr(obj, attr)
+    return obj
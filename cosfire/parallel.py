@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""
+This module provides the thread-level parallelism of the circle strategy. The heavy NumPy and OpenCV calls release
+the GIL, so the filter arguments, blurred responses and variations of a CircleStrategy can be evaluated by a pool
+of threads. Results are always consumed in submission order, so the output does not depend on the scheduling.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import os
+
+import cv2
+
+# Number of worker threads for n_jobs, following the scikit-learn convention:
+# None means 1, negative values count back from the number of CPUs (-1: all CPUs)
+def effectiveJobs(n_jobs):
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return n_jobs
+
+# Thread pool for the given number of jobs, or the given executor if one is passed
+# Yields None when everything should run in the calling thread
+@contextmanager
+def threadPool(n_jobs, executor=None):
+    if executor is not None:
+        yield executor
+    elif effectiveJobs(n_jobs) <= 1:
+        yield None
+    else:
+        with ThreadPoolExecutor(max_workers=effectiveJobs(n_jobs), thread_name_prefix='cosfire') as pool:
+            yield pool
+
+# Lazily map func over items with at most window calls in flight
+# Yields the results in the order of items
+def mapOrdered(func, items, executor=None, window=1):
+    if executor is None:
+        for item in items:
+            yield func(item)
+        return
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+# Limit the number of threads OpenCV uses internally, so the pool threads
+# and OpenCV's own threads do not oversubscribe the CPUs
+# Note that this is a process-wide setting, restored on exit
+@contextmanager
+def limitThreads(n):
+    if n is None:
+        yield
+        return
+    previous = cv2.getNumThreads()
+    cv2.setNumThreads(n)
+    try:
+        yield
+    finally:
+        cv2.setNumThreads(previous)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""
+This module defines the execution plan of the shift-and-combine step of the circle strategy.
+
+For every variation (psi, upsilon) of the rotation and scale invariance, every tuple (rho, phi, *params) selects a
+blurred filter response, keyed by (rho*upsilon, *params), and shifts it by the rounded offset of the polar position
+(rho*upsilon, phi+psi). Many of these steps coincide: rho=0 gives the same unshifted response for every rotation, and
+at small rho neighbouring rotations round to the same offset. The plan is compiled once at fit time, lists every
+distinct (response key, dx, dy) step once and counts how often each of them is used, so that shifted responses can be
+shared between variations and released after their last use.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+from collections import Counter
+import numpy as np
+
+
+class ShiftPlan():
+
+    def __init__(self, tuples, rotationInvariance, scaleInvariance):
+        self.tuples = list(tuples)
+        self.variations = [(psi, upsilon) for psi in rotationInvariance for upsilon in scaleInvariance]
+
+        # Steps (key, dx, dy) of every variation, in tuple order
+        self.steps = {}
+        for (psi, upsilon) in self.variations:
+            steps = []
+            for (rho, phi, *params) in self.tuples:
+                rho = rho*upsilon
+                phi = phi+psi
+                dx = int(round(rho*np.cos(phi)))
+                dy = int(round(-rho*np.sin(phi)))
+                steps.append( ((rho,)+tuple(params), dx, dy) )
+            self.steps[(psi, upsilon)] = steps
+
+        # Number of times every distinct step is used over all variations
+        self.uses = Counter(step for variation in self.variations for step in self.steps[variation])
+
+    # Whether the plan was compiled for the given tuples and invariances
+    def matches(self, tuples, rotationInvariance, scaleInvariance):
+        return (self.tuples == list(tuples) and
+                self.variations == [(psi, upsilon) for psi in rotationInvariance for upsilon in scaleInvariance])
+
+    # Steps in the order they are evaluated: by variation, then by tuple
+    # With shared=True, only the first use of every distinct step is listed
+    def order(self, shared=False):
+        steps = [step for variation in self.variations for step in self.steps[variation]]
+        return list(dict.fromkeys(steps)) if shared else steps
+
+    # Distinct response keys used by the plan
+    def keys(self):
+        return {key for (key, dx, dy) in self.uses}
+
+    # Largest shift (in pixels) of any step
+    def maxShift(self):
+        return max([max(abs(dx), abs(dy)) for (key, dx, dy) in self.uses], default=0)
+
+    def stats(self):
+        total = sum(self.uses.values())
+        return {
+            'variations': len(self.variations),
+            'steps': total,
+            'distinct': len(self.uses),
+            'shared': sum(1 for n in self.uses.values() if n > 1),
+            'redundant': total - len(self.uses),
+        }
+
+    def __str__(self):
+        stats = self.stats()
+        return "ShiftPlan: {} steps over {} variations, {} distinct ({} shared), {} redundant shifts removed ({:.0%})".format(
+            stats['steps'], stats['variations'], stats['distinct'], stats['shared'], stats['redundant'],
+            stats['redundant']/max(stats['steps'], 1))
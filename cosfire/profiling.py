@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+"""
+This module provides the instrumentation of the circle strategy. A Profiler passed to a CircleStrategy (profiler)
+records a span for every stage of the computation:
+
+- fit: finding the tuples in the prototype,
+- transform, masked, pyramid, points, frame: the transforms of a subject (frame: of a frame of a stream),
+  enclosing the stages below,
+- filter: applying the filter to the subject (or a part of it),
+- blur: blurring a filter response,
+- shift: shifting a blurred response for a step of the plan,
+- combine: the geometric mean of the shifted responses of a variation, enclosing its shifts,
+- max: folding the combined response of a variation into the maximum.
+
+Every span records its duration, its self time (without the spans opened inside it by the same thread), the bytes of
+the arrays it allocated and, with memory=True, the peak of the memory traced by tracemalloc while it was open. The
+traced peak is process-wide: while spans are open on several threads (n_jobs > 1) it cannot be reset per span, so
+the peak of such a span also holds the memory of the other threads, and is only an upper bound. These spans are marked
+peakShared and counted as sharedPeaks. To track the threads with open spans, memory=True also takes the lock of the
+profiler when a span is opened (and when the outermost span of a thread is closed), besides the one taken by every
+finished span, so with n_jobs > 1 the worker threads contend on it more often. memory=True requires Python 3.9 or
+later (tracemalloc.reset_peak).
+
+The spans are aggregated per stage, together with counters such as the hits and misses of the response cache, and
+only the latest maxSpans spans are kept, so a long-running worker uses a bounded amount of memory. Every finished span
+is also passed to the exporters, callables taking the span as a dict, e.g. a JsonLinesExporter.
+
+Without a profiler, the strategy uses NULL_PROFILER, of which every method does nothing.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+import json
+import threading
+import time
+import tracemalloc
+
+
+class Profiler():
+
+    enabled = True
+
+    def __init__(self, exporters=(), maxSpans=1024, memory=False):
+        if memory and not hasattr(tracemalloc, 'reset_peak'):
+            raise ValueError("Profiler(memory=True) requires Python 3.9 or later")
+        self.exporters = list(exporters)
+        self.maxSpans = maxSpans
+        self.memory = memory
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # Threads with open spans, and the times a thread opened a span while another one had open spans
+        self.activeThreads = 0
+        self.overlaps = 0
+        self.reset()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def reset(self):
+        with self.lock:
+            self.spans = deque(maxlen=self.maxSpans)
+            self.stages = {}
+            self.counters = Counter()
+            self.peakBytes = 0
+
+    # Context manager recording a span of the given stage, with the keyword arguments as attributes
+    @contextmanager
+    def span(self, stage, **attributes):
+        stack = self._stack()
+        record = {'stage': stage, 'start': time.time(), 'bytes': 0, 'children': 0.0, 'depth': len(stack)}
+        if self.memory:
+            with self.lock:
+                if not stack:
+                    self.activeThreads += 1
+                    if self.activeThreads > 1:
+                        self.overlaps += 1
+                (current, peak) = tracemalloc.get_traced_memory()
+                # The peak is only reset while no other thread has open spans, whose peaks it would lose
+                record['peakShared'] = self.activeThreads > 1
+                record['overlaps'] = self.overlaps
+                if not record['peakShared']:
+                    tracemalloc.reset_peak()
+            # The peak is reset for this span, so keep the peak so far for the enclosing span
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            record['tracedStart'] = current
+            record['peak'] = 0
+        stack.append(record)
+        t0 = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - t0
+            stack.pop()
+            try:
+                self._finish(record, stage, seconds, attributes, stack[-1] if stack else None)
+            finally:
+                if self.memory and not stack:
+                    with self.lock:
+                        self.activeThreads -= 1
+
+    # Count bytes allocated by the innermost open span of the calling thread
+    def allocated(self, nbytes):
+        stack = self._stack()
+        if stack:
+            stack[-1]['bytes'] += int(nbytes)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    # Aggregated stages and counters
+    # Returns: dict with per stage the number of spans, the total, self and maximum seconds and the
+    # allocated and peak bytes, the counters, and the peak traced memory (None without memory=True)
+    def stats(self):
+        with self.lock:
+            return {
+                'stages': {stage: dict(values) for stage, values in self.stages.items()},
+                'counters': dict(self.counters),
+                'peakBytes': self.peakBytes if self.memory else None,
+            }
+
+    # Text table of the aggregated stages, by decreasing self time
+    def report(self):
+        stats = self.stats()
+        lines = ["{:>10} {:>8} {:>10} {:>10} {:>10} {:>12} {:>12}".format(
+            'stage', 'count', 'total (s)', 'self (s)', 'max (s)', 'allocated', 'peak')]
+        for stage, values in sorted(stats['stages'].items(), key=lambda item: -item[1]['selfSeconds']):
+            lines.append("{:>10} {:>8} {:>10.4f} {:>10.4f} {:>10.4f} {:>12} {:>12}".format(
+                stage, values['count'], values['seconds'], values['selfSeconds'], values['maxSeconds'],
+                _formatBytes(values['bytes']), _formatBytes(values['peakBytes']) if self.memory else ''))
+        for name, value in sorted(stats['counters'].items()):
+            lines.append("{:>10} {}".format(name, value))
+        return "\n".join(lines)
+
+    def _stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def _finish(self, record, stage, seconds, attributes, parent):
+        selfSeconds = seconds - record.pop('children')
+        span = dict(record, seconds=seconds, selfSeconds=selfSeconds, thread=threading.current_thread().name, **attributes)
+        if self.memory:
+            peak = max(span.pop('peak'), tracemalloc.get_traced_memory()[1]) - span.pop('tracedStart')
+            span['peakBytes'] = peak
+        if parent is not None:
+            parent['children'] += seconds
+
+        with self.lock:
+            if self.memory:
+                # Shared if another thread had open spans when this span was opened, or opened one since
+                span['peakShared'] = span['peakShared'] or span.pop('overlaps') != self.overlaps
+                if span['peakShared']:
+                    self.counters['sharedPeaks'] += 1
+            values = self.stages.get(stage)
+            if values is None:
+                values = self.stages[stage] = {'count': 0, 'seconds': 0.0, 'selfSeconds': 0.0, 'maxSeconds': 0.0, 'bytes': 0, 'peakBytes': 0}
+            values['count'] += 1
+            values['seconds'] += seconds
+            values['selfSeconds'] += selfSeconds
+            values['maxSeconds'] = max(values['maxSeconds'], seconds)
+            values['bytes'] += span['bytes']
+            if self.memory:
+                values['peakBytes'] = max(values['peakBytes'], span['peakBytes'])
+                self.peakBytes = max(self.peakBytes, span['peakBytes'])
+            self.spans.append(span)
+        for exporter in self.exporters:
+            exporter(span)
+
+
+# Profiler that records nothing, used when no profiler is given
+class NullProfiler():
+
+    enabled = False
+    _span = nullcontext()
+
+    def span(self, stage, **attributes):
+        return self._span
+
+    def allocated(self, nbytes):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+NULL_PROFILER = NullProfiler()
+
+
+# Exporter writing every span as a line of JSON to a file object or path
+class JsonLinesExporter():
+
+    def __init__(self, file):
+        self.file = open(file, 'a') if isinstance(file, str) else file
+        self.lock = threading.Lock()
+
+    def __call__(self, span):
+        line = json.dumps(span, default=str)
+        with self.lock:
+            self.file.write(line + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+# Exporter logging the spans of the given stages (all if None) that took at least minSeconds
+class LogExporter():
+
+    def __init__(self, log=print, stages=None, minSeconds=0):
+        self.log = log
+        self.stages = stages
+        self.minSeconds = minSeconds
+
+    def __call__(self, span):
+        if (self.stages is None or span['stage'] in self.stages) and span['seconds'] >= self.minSeconds:
+            self.log("{}{}: {:.4f}s".format("\t"*span['depth'], span['stage'], span['seconds']))
+
+
+def _formatBytes(nbytes):
+    for unit in ['B', 'KiB', 'MiB']:
+        if abs(nbytes) < 1024:
+            return "{:.0f} {}".format(nbytes, unit)
+        nbytes /= 1024
+    return "{:.1f} GiB".format(nbytes)
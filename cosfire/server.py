@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+"""
+This module provides a long-running inference server. Requests are queued in a MicroBatcher, of which a single worker
+thread takes the oldest request together with the other waiting requests of the same key (e.g. the image size), up to
+maxBatch of them, and passes them to the handler at once. A request waits at most maxDelay seconds for others to join
+its batch. The queue holds at most maxQueue requests: further requests are rejected, which the HTTP server answers with
+503 so that clients back off.
+
+makeServer() exposes a MicroBatcher over HTTP on localhost:
+
+- POST /segment with an encoded image as the body, answered with the encoded result,
+- GET /metrics with the request counts, batch sizes, throughput and latency percentiles as JSON,
+- GET /health.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import json
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+# Request counts, batch sizes and the latencies of the latest requests
+# Throughput is measured over the requests completed in the last window seconds
+class ServerMetrics():
+
+    def __init__(self, window=60, samples=1024):
+        self.window = window
+        self.started = time.perf_counter()
+        self.latencies = deque(maxlen=samples)
+        self.completions = deque()
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.batches = 0
+
+    def request(self):
+        with self.lock:
+            self.requests += 1
+
+    def reject(self):
+        with self.lock:
+            self.rejected += 1
+
+    # Record a processed batch: the latencies of its requests (seconds), or the number of failed requests
+    def batch(self, latencies=(), failed=0):
+        now = time.perf_counter()
+        with self.lock:
+            self.batches += 1
+            self.completed += len(latencies)
+            self.failed += failed
+            self.latencies.extend(latencies)
+            self.completions.extend([now]*len(latencies))
+            self._expire(now)
+
+    def snapshot(self):
+        now = time.perf_counter()
+        with self.lock:
+            self._expire(now)
+            latencies = np.array(self.latencies)*1000
+            processed = self.completed + self.failed
+            window = min(self.window, now - self.started)
+            return {
+                'uptime': now - self.started,
+                'requests': self.requests,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'batches': self.batches,
+                'meanBatchSize': processed/self.batches if self.batches else 0.0,
+                'throughput': len(self.completions)/window if window > 0 else 0.0,
+                'latencyMs': {
+                    'samples': len(latencies),
+                    'mean': float(latencies.mean()) if len(latencies) else None,
+                    'p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                    'p90': float(np.percentile(latencies, 90)) if len(latencies) else None,
+                    'p99': float(np.percentile(latencies, 99)) if len(latencies) else None,
+                    'max': float(latencies.max()) if len(latencies) else None,
+                },
+            }
+
+    def _expire(self, now):
+        while self.completions and self.completions[0] < now - self.window:
+            self.completions.popleft()
+
+
+class MicroBatcher():
+
+    def __init__(self, handler, maxBatch=8, maxDelay=0.01, maxQueue=32, metrics=None):
+        self.handler = handler
+        self.maxBatch = maxBatch
+        self.maxDelay = maxDelay
+        self.maxQueue = maxQueue
+        self.metrics = ServerMetrics() if metrics is None else metrics
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='cosfire-batcher', daemon=True)
+        self.thread.start()
+        return self
+
+    # Stop the worker after the current batch, failing the requests that are still queued
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        while self.queue:
+            self.queue.popleft()[2].set_exception(RuntimeError("The server was stopped"))
+
+    # Queue a payload, to be handled together with the queued payloads of the same key
+    # Returns: a Future of the result of the handler for the payload
+    # Raises queue.Full when maxQueue payloads are already waiting
+    def submit(self, key, payload):
+        future = Future()
+        with self.condition:
+            if len(self.queue) >= self.maxQueue:
+                self.metrics.reject()
+                raise queue.Full("{} requests are waiting".format(len(self.queue)))
+            self.queue.append( (key, payload, future, time.perf_counter()) )
+            self.metrics.request()
+            self.condition.notify()
+        return future
+
+    def stats(self):
+        with self.condition:
+            queued = len(self.queue)
+        return dict(self.metrics.snapshot(), queued=queued, maxQueue=self.maxQueue, maxBatch=self.maxBatch)
+
+    # The oldest queued request and at most maxBatch-1 later ones with the same key,
+    # waiting until maxDelay after the arrival of the oldest one for the batch to fill up
+    def _next(self):
+        with self.condition:
+            while self.running and not self.queue:
+                self.condition.wait()
+            if not self.queue:
+                return None
+            (key, _, _, arrival) = self.queue[0]
+            while self.running and sum(1 for item in self.queue if item[0] == key) < self.maxBatch:
+                remaining = arrival + self.maxDelay - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch = []
+            rest = deque()
+            for item in self.queue:
+                (batch if item[0] == key and len(batch) < self.maxBatch else rest).append(item)
+            self.queue = rest
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next()
+            if batch is None:
+                return
+            try:
+                results = self.handler([payload for (_, payload, _, _) in batch])
+            except Exception as error:
+                for (_, _, future, _) in batch:
+                    future.set_exception(error)
+                self.metrics.batch(failed=len(batch))
+                continue
+            done = time.perf_counter()
+            for (_, _, future, _), result in zip(batch, results):
+                future.set_result(result)
+            self.metrics.batch([done - arrival for (_, _, _, arrival) in batch])
+
+
+# HTTP server for a started MicroBatcher, see the module description
+# decode(body, query) returns the (key, payload) of a request, encode(result, query) the (content type, bytes)
+# of its response; both raise ValueError for invalid requests. query maps the query parameters to their value.
+# Requests that are not answered within timeout seconds get 504. extraStats() returns a dict added to the metrics.
+def makeServer(batcher, decode, encode, host='127.0.0.1', port=8080, timeout=60, extraStats=None):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            if path == '/metrics':
+                stats = batcher.stats()
+                if extraStats is not None:
+                    stats.update(extraStats())
+                self.reply(200, 'application/json', json.dumps(stats).encode())
+            elif path == '/health':
+                self.reply(200, 'text/plain', b'ok')
+            else:
+                self.reply(404, 'text/plain', b'Not found')
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if url.path != '/segment':
+                return self.reply(404, 'text/plain', b'Not found')
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            try:
+                (key, payload) = decode(body, query)
+                future = batcher.submit(key, payload)
+                result = future.result(timeout)
+                (contentType, data) = encode(result, query)
+            except ValueError as error:
+                return self.reply(400, 'text/plain', str(error).encode())
+            except queue.Full as error:
+                return self.reply(503, 'text/plain', str(error).encode(), {'Retry-After': '1'})
+            # Future.result raises the builtin TimeoutError only from Python 3.11 on
+            except FutureTimeoutError:
+                return self.reply(504, 'text/plain', b'Timed out')
+            except Exception as error:
+                return self.reply(500, 'text/plain', str(error).encode())
+            self.reply(200, contentType, data)
+
+        def reply(self, status, contentType, data, headers=None):
+            headers = {} if headers is None else headers
+            self.send_response(status)
+            self.send_header('Content-Type', contentType)
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        # Requests are counted in the metrics instead of logged
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.batcher = batcher
+    return server
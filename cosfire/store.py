@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+
+"""
+This module provides a chunked, compressed on-disk store for the intermediate responses of the filters, so that they
+can be analysed again (e.g. re-thresholded, or the orientation of the vessels estimated) by reading them from disk
+instead of transforming the images again.
+
+A ResponseStore is a directory with an index (index.json) describing every array, and a data file per array:
+
+- compressed arrays (compression='zlib') are split into chunks of the given chunk shape, every chunk is compressed
+  separately and appended to <file>.chunks, and the index holds the offset and size of every chunk. Reading a part of
+  an array (e.g. a tile of one orientation) only reads and decompresses the chunks it overlaps. With shuffle, the
+  bytes of the values are grouped by significance before compressing (as blosc does), which compresses the
+  smooth responses faster and smaller.
+- uncompressed arrays (compression=None) are stored as <file>.npy and read as a memory map.
+
+The values can be quantized: quantize='float16' stores them as half-precision floats (a relative error of at most
+2^-11), quantize='uint8' as 256 levels between the low and high of valueRange (an error of at most half a level).
+Reading an array returns the values in its original type.
+
+A StoreRecorder, passed to a CircleStrategy (recorder), writes the filter responses of every filter argument and the
+combined response of every orientation of its transforms to a store.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import itertools
+import json
+import os
+import threading
+import zlib
+import numpy as np
+
+FORMAT_VERSION = 1
+INDEX = 'index.json'
+
+# Width and height of the chunks of the arrays written by a StoreRecorder
+CHUNK_SIZE = 256
+
+
+class ResponseStore():
+
+    # Open the store in the directory path: mode 'r' reads it, 'w' creates it (replacing the arrays of an existing
+    # store), 'a' adds arrays to it. The index is written by flush() and close(), or when leaving a with block.
+    def __init__(self, path, mode='r'):
+        if mode not in ('r', 'w', 'a'):
+            raise ValueError("Unknown store mode '{}'".format(mode))
+        self.path = path
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.arrays = {}
+        indexPath = os.path.join(path, INDEX)
+        if mode == 'r' or (mode == 'a' and os.path.exists(indexPath)):
+            with open(indexPath) as f:
+                self.index = json.load(f)
+            if self.index['version'] != FORMAT_VERSION:
+                raise ValueError("Unsupported store format version {}".format(self.index['version']))
+        else:
+            os.makedirs(path, exist_ok=True)
+            if os.path.exists(indexPath):
+                with open(indexPath) as f:
+                    for meta in json.load(f)['arrays'].values():
+                        self._remove(meta['file'])
+            self.index = {'version': FORMAT_VERSION, 'arrays': {}}
+
+    # Create an empty array (reading as zeros until written)
+    # chunks is the shape of the chunks, by default CHUNK_SIZE x CHUNK_SIZE over the first two axes of an image,
+    # or the last two axes of a stack of images (e.g. one orientation per chunk)
+    # valueRange (low, high) is the range of the values for quantize='uint8'
+    # attrs is a dict stored with the array, e.g. the keys of its layers
+    # Returns: the StoredArray
+    def create(self, name, shape, dtype=np.float32, chunks=None, quantize=None, valueRange=None, compression='zlib', level=1, shuffle=True, attrs=None):
+        if self.mode == 'r':
+            raise ValueError("The store is opened for reading")
+        if quantize not in (None, 'float16', 'uint8'):
+            raise ValueError("Unknown quantization '{}'".format(quantize))
+        if compression not in (None, 'zlib'):
+            raise ValueError("Unknown compression '{}'".format(compression))
+        if quantize == 'uint8' and valueRange is None:
+            raise ValueError("Quantization to uint8 requires the valueRange of the values")
+        shape = tuple(int(n) for n in shape)
+        chunks = defaultChunks(shape) if chunks is None else tuple(min(int(c), max(n, 1)) for c, n in zip(chunks, shape))
+        storedType = {None: np.dtype(dtype), 'float16': np.dtype(np.float16), 'uint8': np.dtype(np.uint8)}[quantize]
+        with self.lock:
+            if name in self.index['arrays']:
+                if name in self.arrays:
+                    self.arrays.pop(name)._close()
+                self._remove(self.index['arrays'][name]['file'])
+            meta = {
+                'file': "{:04d}".format(len(os.listdir(self.path))) + ('.chunks' if compression else '.npy'),
+                'shape': list(shape),
+                'dtype': np.dtype(dtype).str,
+                'storedType': storedType.str,
+                'chunks': list(chunks),
+                'quantize': quantize,
+                'valueRange': [float(v) for v in valueRange] if valueRange is not None else None,
+                'compression': compression,
+                'level': level,
+                'shuffle': bool(shuffle) and storedType.itemsize > 1,
+                'offsets': {},
+                'attrs': attrs or {},
+            }
+            while os.path.exists(os.path.join(self.path, meta['file'])):
+                meta['file'] = '_' + meta['file']
+            if compression is None:
+                np.lib.format.open_memmap(os.path.join(self.path, meta['file']), mode='w+', dtype=storedType, shape=shape).flush()
+            else:
+                open(os.path.join(self.path, meta['file']), 'wb').close()
+            self.index['arrays'][name] = meta
+        return self[name]
+
+    # Store an array, see create() for the keyword arguments; for quantize='uint8' the
+    # valueRange defaults to the minimum and maximum of the array
+    # Returns: the StoredArray
+    def write(self, name, array, **options):
+        array = np.asarray(array)
+        if options.get('quantize') == 'uint8' and options.get('valueRange') is None:
+            options['valueRange'] = (float(array.min()), float(array.max())) if array.size else (0.0, 1.0)
+        stored = self.create(name, array.shape, array.dtype, **options)
+        stored[...] = array
+        return stored
+
+    def names(self):
+        return list(self.index['arrays'])
+
+    def __contains__(self, name):
+        return name in self.index['arrays']
+
+    # The StoredArray of the given name, of which the values are only read when indexed
+    def __getitem__(self, name):
+        with self.lock:
+            array = self.arrays.get(name)
+            if array is None:
+                if name not in self.index['arrays']:
+                    raise KeyError(name)
+                array = self.arrays[name] = StoredArray(self, name, self.index['arrays'][name])
+            return array
+
+    # Write the index, replacing the previous one at once so that readers never see a partial index
+    def flush(self):
+        if self.mode == 'r':
+            return
+        with self.lock:
+            for array in self.arrays.values():
+                array._flush()
+            temporary = os.path.join(self.path, INDEX + '.tmp')
+            with open(temporary, 'w') as f:
+                json.dump(self.index, f)
+            os.replace(temporary, os.path.join(self.path, INDEX))
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            for array in self.arrays.values():
+                array._close()
+            self.arrays = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _remove(self, file):
+        path = os.path.join(self.path, file)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# Array of a ResponseStore, read and written with basic indexing: integers and slices with step 1
+# Compressed arrays are written in whole chunks (or up to the end of an axis)
+class StoredArray():
+
+    def __init__(self, store, name, meta):
+        self.store = store
+        self.name = name
+        self.meta = meta
+        self.shape = tuple(meta['shape'])
+        self.ndim = len(self.shape)
+        self.dtype = np.dtype(meta['dtype'])
+        self.storedType = np.dtype(meta['storedType'])
+        self.chunks = tuple(meta['chunks'])
+        self.attrs = meta['attrs']
+        self.path = os.path.join(store.path, meta['file'])
+        self.lock = threading.Lock()
+        self.file = None
+        self.data = None
+
+    def __getitem__(self, key):
+        (bounds, kept) = self._bounds(key)
+        if self.meta['compression'] is None:
+            stored = np.array(self._memmap()[tuple(slice(a, b) for (a, b) in bounds)])
+        else:
+            stored = np.zeros([b-a for (a, b) in bounds], dtype=self.storedType)
+            for index in self._chunkRange(bounds):
+                chunk = self._readChunk(index)
+                if chunk is not None:
+                    (target, source) = self._overlap(index, bounds)
+                    stored[target] = chunk[source]
+        return self._dequantize(stored).reshape([b-a for (a, b), keep in zip(bounds, kept) if keep])
+
+    def __setitem__(self, key, value):
+        if self.store.mode == 'r':
+            raise ValueError("The store is opened for reading")
+        (bounds, kept) = self._bounds(key)
+        value = np.asarray(value).reshape([b-a for (a, b), keep in zip(bounds, kept) if keep] if np.ndim(value) else ())
+        stored = self._quantize(np.broadcast_to(value, [b-a for (a, b), keep in zip(bounds, kept) if keep]).reshape([b-a for (a, b) in bounds]))
+        if self.meta['compression'] is None:
+            self._memmap()[tuple(slice(a, b) for (a, b) in bounds)] = stored
+            return
+        for (a, b), c, n in zip(bounds, self.chunks, self.shape):
+            if a % c != 0 or (b % c != 0 and b != n):
+                raise ValueError("Writes to the compressed array '{}' must cover whole chunks of {}".format(self.name, self.chunks))
+        for index in self._chunkRange(bounds):
+            (target, source) = self._overlap(index, bounds)
+            self._writeChunk(index, stored[target])
+
+    def __array__(self, dtype=None, copy=None):
+        values = self[...]
+        return values if dtype is None else values.astype(dtype)
+
+    def __len__(self):
+        return self.shape[0]
+
+    # Size of the stored data in bytes
+    def nbytes(self):
+        if self.meta['compression'] is None:
+            return int(np.prod(self.shape))*self.storedType.itemsize
+        return sum(size for (offset, size) in self.meta['offsets'].values())
+
+    # Bounds (start, stop) of an index on every axis, and whether the axis is kept (not indexed by an integer)
+    def _bounds(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        if any(k is Ellipsis for k in key):
+            at = key.index(Ellipsis)
+            key = key[:at] + (slice(None),)*(self.ndim - len(key) + 1) + key[at+1:]
+        if len(key) > self.ndim:
+            raise IndexError("Too many indices for an array of {} dimensions".format(self.ndim))
+        key = key + (slice(None),)*(self.ndim - len(key))
+        bounds = []
+        kept = []
+        for k, n in zip(key, self.shape):
+            if isinstance(k, slice):
+                (start, stop, step) = k.indices(n)
+                if step != 1:
+                    raise IndexError("Only slices with step 1 are supported")
+                bounds.append( (start, max(start, stop)) )
+                kept.append(True)
+            else:
+                i = int(k)
+                if not -n <= i < n:
+                    raise IndexError("Index {} is out of bounds for an axis of size {}".format(i, n))
+                i %= n
+                bounds.append( (i, i+1) )
+                kept.append(False)
+        return bounds, kept
+
+    # Indices of the chunks overlapping the bounds
+    def _chunkRange(self, bounds):
+        if any(b <= a for (a, b) in bounds):
+            return []
+        return itertools.product(*[range(a//c, (b-1)//c + 1) for (a, b), c in zip(bounds, self.chunks)])
+
+    # Slices of the overlap of a chunk with the bounds: in the bounded region, and in the chunk
+    def _overlap(self, index, bounds):
+        target = []
+        source = []
+        for i, (a, b), c, n in zip(index, bounds, self.chunks, self.shape):
+            (c0, c1) = (i*c, min((i+1)*c, n))
+            (o0, o1) = (max(a, c0), min(b, c1))
+            target.append(slice(o0-a, o1-a))
+            source.append(slice(o0-c0, o1-c0))
+        return tuple(target), tuple(source)
+
+    def _chunkShape(self, index):
+        return tuple(min((i+1)*c, n) - i*c for i, c, n in zip(index, self.chunks, self.shape))
+
+    def _readChunk(self, index):
+        entry = self.meta['offsets'].get(",".join(map(str, index)))
+        if entry is None:
+            return None
+        (offset, size) = entry
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, 'rb' if self.store.mode == 'r' else 'r+b')
+            self.file.seek(offset)
+            data = self.file.read(size)
+        data = np.frombuffer(zlib.decompress(data), dtype=np.uint8)
+        if self.meta['shuffle']:
+            data = data.reshape(self.storedType.itemsize, -1).T.copy()
+        return data.view(self.storedType).reshape(self._chunkShape(index))
+
+    def _writeChunk(self, index, chunk):
+        data = np.ascontiguousarray(chunk)
+        if self.meta['shuffle']:
+            data = data.view(np.uint8).reshape(-1, self.storedType.itemsize).T
+        data = zlib.compress(np.ascontiguousarray(data).tobytes(), self.meta['level'])
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, 'r+b')
+            self.file.seek(0, os.SEEK_END)
+            offset = self.file.tell()
+            self.file.write(data)
+            self.meta['offsets'][",".join(map(str, index))] = [offset, len(data)]
+
+    def _memmap(self):
+        if self.data is None:
+            self.data = np.load(self.path, mmap_mode='r' if self.store.mode == 'r' else 'r+')
+        return self.data
+
+    def _quantize(self, values):
+        if self.meta['quantize'] == 'uint8':
+            (low, high) = self.meta['valueRange']
+            scale = 255/(high - low) if high > low else 0.0
+            return np.clip(np.rint((values - low)*scale), 0, 255).astype(np.uint8)
+        return values.astype(self.storedType)
+
+    def _dequantize(self, stored):
+        if self.meta['quantize'] == 'uint8':
+            (low, high) = self.meta['valueRange']
+            values = stored.astype(self.dtype)
+            values *= (high - low)/255
+            values += low
+            return values
+        return stored.astype(self.dtype, copy=False)
+
+    def _flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+            if self.data is not None and self.store.mode != 'r':
+                self.data.flush()
+
+    def _close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.data = None
+
+
+# Chunks of an array: CHUNK_SIZE x CHUNK_SIZE over the first two axes of a (height, width) or (height, width,
+# channels) image, over the last two of a stack of images, and 1 along the other axes of a stack
+def defaultChunks(shape):
+    if len(shape) <= 3 and not (len(shape) == 3 and shape[2] > 4):
+        return tuple(min(CHUNK_SIZE, max(n, 1)) if axis < 2 else max(n, 1) for axis, n in enumerate(shape))
+    return (1,)*(len(shape)-2) + tuple(min(CHUNK_SIZE, max(n, 1)) for n in shape[-2:])
+
+
+# Recorder of a CircleStrategy (see recorder) writing the intermediate responses of its transforms to a store:
+#  - <prefix>/filtered: the filter response of every filter argument, as (arguments, height, width), with
+#    the arguments in the attribute 'keys'
+#  - <prefix>/orientations: the combined response of every variation, as (variations, height, width), with
+#    the (psi, upsilon) of the variations in the attribute 'keys'
+# The responses are quantized as given (float16 by default) and compressed with the options of ResponseStore.create()
+class StoreRecorder():
+
+    def __init__(self, store, prefix, quantize='float16', **options):
+        self.store = store
+        self.prefix = prefix
+        self.quantize = quantize
+        self.options = options
+        self.lock = threading.Lock()
+
+    def __call__(self, strategy, kind, key, response):
+        if kind == 'filtered':
+            (name, keys) = (self.prefix + '/filtered', list(strategy.blurPlan))
+        elif kind == 'orientation':
+            (name, keys) = (self.prefix + '/orientations', list(strategy.plan.variations))
+        else:
+            raise ValueError("Unknown response kind '{}'".format(kind))
+        shape = (len(keys),) + np.shape(response)
+        with self.lock:
+            if name not in self.store or tuple(self.store[name].shape) != shape:
+                chunks = (1, CHUNK_SIZE, CHUNK_SIZE) + np.shape(response)[2:]
+                self.store.create(name, shape, response.dtype, chunks, self.quantize, attrs={'keys': _plainKeys(keys)}, **self.options)
+        self.store[name][keys.index(key)] = response
+
+
+def _plainKeys(keys):
+    return [[float(value) for value in key] for key in keys]
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+"""
+This module provides a parameter sweep for tuning B-COSFIRE filters against ground-truth segmentations.
+
+A configuration consists of one or more circle strategies (e.g. the symmetrical and asymmetrical filters of
+BCOSFIRE.py) whose responses are summed, rescaled to [0, 255] and thresholded. The sweep evaluates a grid of strategy
+parameters over a set of images, sharing every intermediate result between the configurations:
+
+- the filter (DoG) and blurred responses are shared through a SharedResponseCache per image, and the configurations
+  are ordered so that the ones using the same filter arguments and blurs are evaluated after each other,
+- the combined response of a strategy is computed once per image for all configurations that contain it, kept in a
+  ResponseCache planned over the order of the configurations,
+- all segmentation thresholds are evaluated in a single pass over a histogram of the response.
+
+The result is a table with the AUC, the best accuracy and its threshold and the runtime of every configuration.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import itertools
+import json
+import time
+import numpy as np
+
+from .cosfire import CircleStrategy
+from .cache import ResponseCache, SharedResponseCache
+from .functions import rescaleImage
+from .models import modelKey, registry, _plain
+
+# Number of histogram bins per grey level of the rescaled response
+SCAN_RESOLUTION = 16
+
+# Construct a CircleStrategy from keyword arguments and fit it through the model registry
+# maxPhi (not a CircleStrategy argument) keeps only the tuples with phi <= maxPhi, to make the filter asymmetrical
+def makeStrategy(parameters, **options):
+    parameters = dict(parameters, **options)
+    maxPhi = parameters.pop('maxPhi', None)
+    strategy = registry.fit(CircleStrategy(**parameters))
+    if maxPhi is not None:
+        strategy.tuples = [tupl for tupl in strategy.tuples if tupl[1] <= maxPhi]
+    return strategy
+
+# All combinations of the grid values applied to the base parameters
+# base maps the name of every strategy to its keyword arguments, the grid maps 'name__parameter'
+# (or 'parameter' for all strategies) to a list of values
+# Returns: list of (grid values, {name: keyword arguments}) pairs
+def configurations(base, grid):
+    names = list(grid)
+    result = []
+    for values in itertools.product(*[grid[name] for name in names]):
+        parameters = {strategy: dict(kwargs) for strategy, kwargs in base.items()}
+        for name, value in zip(names, values):
+            strategy, _, parameter = name.rpartition('__')
+            for target in ([strategy] if strategy else list(base)):
+                if target not in parameters:
+                    raise ValueError("Unknown strategy '{}' in grid parameter '{}'".format(target, name))
+                parameters[target][parameter] = value
+        result.append( (dict(zip(names, values)), parameters) )
+    return result
+
+# Histograms of the rescaled response of the positive and negative pixels inside the mask
+# Bin k holds the values in ((k-1)/SCAN_RESOLUTION, k/SCAN_RESOLUTION], so resp > t for the bins > t*SCAN_RESOLUTION
+def responseHistograms(response, truth, mask=None):
+    bins = np.ceil(response*SCAN_RESOLUTION).astype(np.intp)
+    np.clip(bins, 0, 255*SCAN_RESOLUTION, out=bins)
+    truth = np.asarray(truth) != 0
+    inside = np.ones(truth.shape, bool) if mask is None else np.asarray(mask) != 0
+    size = 255*SCAN_RESOLUTION + 1
+    return (np.bincount(bins[truth & inside], minlength=size),
+            np.bincount(bins[~truth & inside], minlength=size))
+
+# AUC and the accuracy at every threshold from the histograms of the positive and negative pixels
+# Returns: dict with the AUC, and the best accuracy and its threshold, sensitivity and specificity
+def scanThresholds(positives, negatives, thresholds=range(255)):
+    # Number of pixels in bin k or above, for every k
+    tp = np.append(np.cumsum(positives[::-1])[::-1], 0)
+    fp = np.append(np.cumsum(negatives[::-1])[::-1], 0)
+    tpr = tp/max(int(tp[0]), 1)
+    fpr = fp/max(int(fp[0]), 1)
+    auc = float(np.sum((fpr[:-1] - fpr[1:]) * (tpr[:-1] + tpr[1:]) / 2))
+
+    # resp > t for the bins above t*SCAN_RESOLUTION
+    thresholds = np.asarray(thresholds)
+    above = thresholds*SCAN_RESOLUTION + 1
+    sensitivity = tpr[above]
+    specificity = 1 - fpr[above]
+    accuracy = (tp[above] + (fp[0] - fp[above])) / max(int(tp[0] + fp[0]), 1)
+    best = int(np.argmax(accuracy))
+    return {
+        'auc': auc,
+        'accuracy': float(accuracy[best]),
+        'threshold': int(thresholds[best]),
+        'sensitivity': float(sensitivity[best]),
+        'specificity': float(specificity[best]),
+    }
+
+# Key identifying the response of a strategy: its fitted tuples, and every argument of its constructor,
+# including the runtime options (e.g. combiner, shiftMode or dtype) that change the response or its cost
+def strategyKey(strategy, maxPhi=None):
+    # The prototype is identified by its hash in modelKey, the shared cache is set by the sweep
+    params = {name: value for name, value in strategy.get_params(deep=False).items() if name not in ('prototype', 'sharedCache')}
+    return json.dumps([modelKey(strategy), _plain(params), _plain(maxPhi), _plain(strategy.tuples)], sort_keys=True, default=_keyValue)
+
+# JSON value of an argument that is not plain data: the name of a class or function, or the identity of an object
+def _keyValue(value):
+    if isinstance(value, np.dtype):
+        return value.str
+    if hasattr(value, '__qualname__'):
+        return value.__module__ + ':' + value.__qualname__
+    return '{}@{:x}'.format(type(value).__name__, id(value))
+
+# Evaluate all configurations of the grid on the subjects against the ground truths (non-zero: vessel)
+# Only the pixels inside the masks are evaluated, and the responses are multiplied by the masks as in BCOSFIRE()
+# options are passed to every strategy (e.g. dtype or shiftMode) unless the grid sets them. cacheBudget bounds the filter and blurred
+# responses shared per image, responseBudget the combined responses of the strategies (both in bytes).
+# Returns: list of rows, one per configuration in grid order, with the grid values and the scores; seconds is the
+# time spent on a configuration, without the intermediate responses computed earlier for other configurations
+def sweepParameters(base, grid, subjects, truths, masks=None, thresholds=range(255), cacheBudget=2**30, responseBudget=2**30, log=None, **options):
+    configs = configurations(base, grid)
+    masks = [None]*len(subjects) if masks is None else masks
+
+    # Fit every distinct strategy once
+    t0 = time.perf_counter()
+    strategies = {}
+    layout = []
+    for (values, parameters) in configs:
+        keys = []
+        for name, kwargs in parameters.items():
+            # The grid values take precedence over the options shared by all configurations
+            strategy = makeStrategy(dict(options, **kwargs))
+            key = strategyKey(strategy, kwargs.get('maxPhi'))
+            strategies.setdefault(key, strategy)
+            keys.append(key)
+        layout.append(keys)
+    if log is not None:
+        log("{} configurations with {} distinct strategies, fitted in {:.2f}s".format(len(configs), len(strategies), time.perf_counter()-t0))
+
+    # Evaluate configurations sharing filter arguments and blurs after each other
+    def orderKey(i):
+        return json.dumps([_plain([kwargs.get('filterArgs'), kwargs.get('sigma0'), kwargs.get('alpha'), kwargs.get('rhoList')])
+                           for kwargs in configs[i][1].values()])
+    order = sorted(range(len(configs)), key=orderKey)
+
+    seconds = np.zeros(len(configs))
+    positives = np.zeros((len(configs), 255*SCAN_RESOLUTION + 1), np.int64)
+    negatives = np.zeros((len(configs), 255*SCAN_RESOLUTION + 1), np.int64)
+    for index, (subject, truth, mask) in enumerate(zip(subjects, truths, masks)):
+        shared = SharedResponseCache(cacheBudget)
+        for strategy in strategies.values():
+            strategy.sharedCache = shared
+        responses = ResponseCache(responseBudget)
+        responses.plan([key for i in order for key in layout[i]])
+
+        for i in order:
+            t1 = time.perf_counter()
+            # The full subject is transformed (not only the mask) so that every strategy reads the same fingerprint
+            response = None
+            for key in layout[i]:
+                strategyResponse = responses.get(key, lambda: strategies[key].transform(subject))
+                response = strategyResponse.copy() if response is None else response + strategyResponse
+                responses.release(key)
+            if mask is not None:
+                response = np.multiply(response, mask)
+            response = rescaleImage(response, 0, 255)
+            (pos, neg) = responseHistograms(response, truth, mask)
+            positives[i] += pos
+            negatives[i] += neg
+            seconds[i] += time.perf_counter() - t1
+
+        for strategy in strategies.values():
+            strategy.sharedCache = None
+        if log is not None:
+            log("Image {}/{}: {} shared and {} combined responses computed".format(
+                index+1, len(subjects), shared.misses, responses.misses))
+
+    rows = []
+    for i, (values, parameters) in enumerate(configs):
+        rows.append(dict(values, **scanThresholds(positives[i], negatives[i], thresholds), seconds=float(seconds[i])))
+    return rows
+
+# Format the rows of sweepParameters() as a text table
+def formatTable(rows, columns=None):
+    if not rows:
+        return ''
+    columns = columns or list(rows[0])
+    def cell(value):
+        if isinstance(value, float):
+            return "{:.4f}".format(value)
+        return str(_plain(value))
+    cells = [[cell(row.get(column)) for column in columns] for row in rows]
+    widths = [max(len(column), *[len(line[j]) for line in cells]) for j, column in enumerate(columns)]
+    lines = ["  ".join(column.rjust(width) for column, width in zip(columns, widths))]
+    lines += ["  ".join(value.rjust(width) for value, width in zip(line, widths)) for line in cells]
+    return "\n".join(lines)
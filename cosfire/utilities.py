@@ -24,22 +24,38 @@ class ImageObject():
                 setattr(self, key, value)
 
 
-# Experimental class
+# Stack of images of the same shape, backed by a single 3D array with one layer per image
+# The parameters of the filter that produced every layer are kept in params
 class ImageStack():
 
     def __init__(self):
-        self.stack = []
+        self.array = None
+        self.params = []
         self.threshold = 0
 
+    # The layers as a list of ImageObjects holding views of the array
+    # Assigning a list of images or ImageObjects replaces the array (only their params are kept)
+    @property
+    def stack(self):
+        if self.array is None:
+            return []
+        return [ImageObject(image, params=params) for image, params in zip(self.array, self.params)]
+
+    @stack.setter
+    def stack(self, items):
+        items = [item if type(item) is ImageObject else ImageObject(item) for item in items]
+        self.params = [getattr(item, 'params', None) for item in items]
+        self.array = np.stack([item.image for item in items]) if items else None
+
     def push(self, image):
-        if type(image) is ImageObject:
-            self.stack.append(image)
-        else:
-            self.stack.append(ImageObject(image))
+        self.stack = self.stack + [image]
         return self
 
     def pop(self):
-        return self.stack.pop()
+        stack = self.stack
+        item = stack.pop()
+        self.stack = stack
+        return item
 
     # Reduce the stack to a single item: the result of a given
     # function after passing it the entire stack as a list
@@ -50,9 +66,10 @@ class ImageStack():
     # Pass all current items in the stack to a given function
     # The function may push new items but these are not passed again later
     def applyAllCurrent(self, func, *args):
+        stack = self.stack
         stack2 = []
-        while self.stack:
-            func(stack2, self.stack.pop(), *args)
+        while stack:
+            func(stack2, stack.pop(), *args)
         self.stack = stack2
         return self
 
@@ -60,12 +77,14 @@ class ImageStack():
     # The function may push new items and these are passed again later
     # This means this may run indefinitely/infinitely!
     def applyIndef(self, func, *args):
-        while self.stack:
-            func(self.stack, self.stack.pop(), *args)
+        stack = self.stack
+        while stack:
+            func(stack, stack.pop(), *args)
+        self.stack = stack
         return self
 
-    # Apply a filter to all items in the stack, popping them
-    # and pushing the results
+    # Apply a filter to all items in the stack, replacing them by the
+    # responses to all combinations of the filter arguments
     def applyFilter(self, filt, filterArgs):
         # Compute all combinations of parameters
         argList = [(v,) for v in filterArgs[0]] if type(filterArgs[0])==list else [(filterArgs[0],)]
@@ -75,28 +94,31 @@ class ImageStack():
             else:
                 argList = [tupl + (arg,) for tupl in argList]
 
-        # Apply all possible filters
-        def applyFilter(stack, item, filt, argList):
-            responses = [ImageObject(filt(*tupl).transform(item.image), params=tupl) for tupl in argList]
-            stack.extend(responses)
+        # Apply all possible filters; the combinations are stacked in reverse order
+        # per image, so that ties in valueAtPoint go to the last combination
+        params = [tupl for image in self.array for tupl in reversed(argList)]
+        responses = np.stack([filt(*tupl).transform(image) for image in self.array for tupl in reversed(argList)])
 
-        def applyTreshold(stack, item, treshold):
-            tresh = treshold*np.max(item.image)
-            stack.append( ImageObject(np.where(item.image > tresh, item.image, 0), params=item.params) )
-
-        self.applyAllCurrent(applyFilter, filt, argList)
-        self.applyAllCurrent(applyTreshold, self.threshold)
+        # Set the values of every layer below threshold*max of that layer to 0
+        maxima = responses.max(axis=tuple(range(1, responses.ndim)), keepdims=True)
+        self.array = np.where(responses > self.threshold*maxima, responses, 0)
+        self.params = params
 
         return self
 
+    # Largest value over all layers at the points (xs[i], ys[i]) and the layer it was found in
+    # Returns: (values, layers) arrays, with value 0 and layer -1 where no layer is positive
+    def valuesAtPoints(self, xs, ys):
+        if self.array is None:
+            return np.zeros(np.shape(xs)), np.full(np.shape(xs), -1)
+        columns = self.array[:, ys, xs]
+        layers = np.argmax(columns, axis=0)
+        values = np.take_along_axis(columns, layers[None], axis=0)[0]
+        positive = values > 0
+        return np.where(positive, values, 0), np.where(positive, layers, -1)
+
     def valueAtPoint(self, x, y):
-        val = 0
-        params = None
-        for img in self.stack:
-            if img.image[y][x] > val:
-                val = img.image[y][x]
-                params = img.params
-        if val > 0:
-            return val,params
-        else:
+        values, layers = self.valuesAtPoints(np.array([x]), np.array([y]))
+        if layers[0] < 0:
             return 0,None
+        return values[0],self.params[layers[0]]
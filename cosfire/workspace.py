@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""
+This module provides the workspace of the frame-stream mode (see CircleStrategy.transformStream): named arrays and
+objects that are created when first requested and reused for every later frame of the same shape, so that a stream
+of frames is transformed without allocating after the first frame, and the statistics kept for such a stream.
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the BSD General Public License as published by The COSFIRE Consolidation Project, version 0.0.1.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the BSD General Public License for more details.
+You should have received a copy of the BSD General Public License along with
+this program. If not, see https://github.com/Brains-for-hire/bcosfire_python/blob/main/LICENSE.
+"""
+
+import numpy as np
+
+
+class Workspace():
+
+    def __init__(self, shape, dtype=np.float64):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.arrays = {}
+        self.objects = {}
+        self.nbytes = 0
+        self.allocations = 0
+
+    # Array for key, of the frame shape and type unless given, allocated (filled with zeros) when first requested
+    def array(self, key, shape=None, dtype=None):
+        array = self.arrays.get(key)
+        if array is None:
+            array = self.arrays[key] = np.zeros(self.shape if shape is None else shape, self.dtype if dtype is None else dtype)
+            self.nbytes += array.nbytes
+            self.allocations += 1
+        return array
+
+    # Object for key (e.g. a filter), made by make() when first requested
+    def get(self, key, make):
+        value = self.objects.get(key)
+        if value is None:
+            value = self.objects[key] = make()
+        return value
+
+    # Whether the workspace was allocated for frames of the given shape
+    def matches(self, shape):
+        return self.shape == tuple(shape)
+
+    def stats(self):
+        return {'arrays': len(self.arrays), 'nbytes': self.nbytes, 'allocations': self.allocations}
+
+
+# Reset the statistics of a frame stream in stats (a new dict if None): the number of frames, the seconds spent on
+# the first frame (which allocates the workspaces) and on the later ones, the sustained frames per second over the
+# later frames, and the bytes of the workspaces
+# Returns: stats
+def streamStats(stats=None):
+    stats = {} if stats is None else stats
+    stats.update(frames=0, firstSeconds=0.0, seconds=0.0, fps=0.0, workspaceBytes=0)
+    return stats
+
+# Add a frame transformed in the given seconds with the given workspaces to the statistics of streamStats()
+def recordFrame(stats, seconds, *workspaces):
+    stats['frames'] += 1
+    if stats['frames'] == 1:
+        stats['firstSeconds'] = seconds
+    else:
+        stats['seconds'] += seconds
+        stats['fps'] = (stats['frames']-1)/stats['seconds'] if stats['seconds'] > 0 else 0.0
+    stats['workspaceBytes'] = sum(workspace.nbytes for workspace in workspaces)